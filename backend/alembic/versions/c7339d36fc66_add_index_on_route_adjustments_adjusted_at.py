@@ -0,0 +1,39 @@
+"""Add index on route_adjustments.adjusted_at
+
+Revision ID: c7339d36fc66
+Revises: 857aab224976
+Create Date: 2026-10-16 10:12:41.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7339d36fc66'
+down_revision: Union[str, None] = '857aab224976'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_route_adjustments_adjusted_at'
+
+
+def _has_index() -> Union[bool, None]:
+    """route_adjustmentsテーブルが無ければNone、あればインデックスの有無を返す"""
+    inspector = sa.inspect(op.get_bind())
+    if 'route_adjustments' not in inspector.get_table_names():
+        return None
+    return any(ix['name'] == INDEX_NAME for ix in inspector.get_indexes('route_adjustments'))
+
+
+def upgrade() -> None:
+    # 学習サービスの期間指定（adjusted_at >= 基準日）を全件走査ではなく範囲スキャンにする
+    if _has_index() is False:
+        op.create_index(INDEX_NAME, 'route_adjustments', ['adjusted_at'])
+
+
+def downgrade() -> None:
+    if _has_index():
+        op.drop_index(INDEX_NAME, table_name='route_adjustments')
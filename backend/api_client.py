@@ -0,0 +1,75 @@
+"""
+動作確認スクリプト共通のAPIクライアント
+起動中のAPIサーバーに対する接続・ジョブ待機・結果保存をまとめる
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # orjsonが無い環境では標準のjsonを使う
+    ORJSON_AVAILABLE = False
+
+# ベースURL
+base_url = "http://localhost:8000/api/v1"
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+JSON_HEADERS = {"Content-Type": "application/json"}  # 変換済みの本文を送るときのヘッダー
+TIMEOUT = (0.5, 30)  # requestsの（接続, 読み取り）タイムアウト秒数。サーバー停止時に待ち続けない
+
+# 接続を使い回すセッション（リクエストごとにTCP接続を張り直さない）
+session = requests.Session()
+session.mount("http://", HTTPAdapter(
+    pool_connections=32, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.1)
+))
+
+
+def wait_for_job(job_id, timeout=60):
+    """ジョブが完了・失敗するまで状態を取得（間隔は0.1秒から最大2秒まで伸ばす）"""
+    delay = 0.1
+    deadline = time.monotonic() + timeout
+    status = None
+    while time.monotonic() < deadline:
+        response = session.get(f"{base_url}/optimize/status/{job_id}", timeout=TIMEOUT)
+        if response.status_code == 200:
+            status = response.json()
+            if status['status'] in ('completed', 'failed'):
+                return status
+        time.sleep(delay)
+        delay = min(delay * 1.5, 2.0)
+    return status
+
+
+async def request_all(method, paths, payloads=None):
+    """複数のリクエストを並行して送信（レスポンスは入力順）"""
+    if payloads is None:
+        payloads = [None] * len(paths)
+    async with httpx.AsyncClient(base_url=base_url, limits=HTTP_LIMITS, timeout=30) as client:
+        return await asyncio.gather(*(
+            client.request(method, path, json=payload) for path, payload in zip(paths, payloads)
+        ))
+
+
+def encode_json(data):
+    """リクエスト本文をJSONのバイト列に変換（同じ本文を繰り返し送るときは1回だけ変換する）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def save_json(filename, data):
+    """結果をJSONファイルに保存（orjsonがあればバイト列を直接書き込む）"""
+    if ORJSON_AVAILABLE:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.models.database import get_db
-from app.schemas.guest import GuestCreate, GuestUpdate, GuestResponse
+from app.schemas.guest import GuestCreate, GuestBulkCreate, GuestUpdate, GuestResponse
 from app.crud.guest import guest as crud_guest
 
 router = APIRouter()
@@ -43,6 +43,17 @@ def create_guest(
     return crud_guest.create(db=db, obj_in=guest_in)
 
 
+@router.post("/bulk", response_model=List[GuestResponse])
+def create_guests_bulk(
+    guests_in: GuestBulkCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    複数のゲストをまとめて作成（レスポンスは入力順）
+    """
+    return crud_guest.create_multi(db=db, objs_in=guests_in.items)
+
+
 @router.get("/{guest_id}", response_model=GuestResponse)
 def read_guest(
     guest_id: UUID,
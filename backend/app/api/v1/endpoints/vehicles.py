@@ -9,7 +9,7 @@ from sqlalchemy.orm import Session
 
 from app.models.database import get_db
 from app.models.vehicle import VehicleStatus
-from app.schemas.vehicle import VehicleCreate, VehicleUpdate, VehicleResponse
+from app.schemas.vehicle import VehicleCreate, VehicleBulkCreate, VehicleUpdate, VehicleResponse
 from app.crud.vehicle import vehicle as crud_vehicle
 
 router = APIRouter()
@@ -44,6 +44,17 @@ def create_vehicle(
     return crud_vehicle.create(db=db, obj_in=vehicle_in)
 
 
+@router.post("/bulk", response_model=List[VehicleResponse])
+def create_vehicles_bulk(
+    vehicles_in: VehicleBulkCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    複数の車両をまとめて作成（レスポンスは入力順）
+    """
+    return crud_vehicle.create_multi(db=db, objs_in=vehicles_in.items)
+
+
 @router.get("/available", response_model=List[VehicleResponse])
 def read_available_vehicles(
     db: Session = Depends(get_db)
@@ -39,6 +39,8 @@ class Settings(BaseSettings):
     
         # Google Maps API
     GOOGLE_MAPS_API_KEY: Optional[str] = "your-google-maps-api-key"
+    DISTANCE_MATRIX_CACHE_PATH: str = "/tmp/route_cache.sqlite3"
+    DISTANCE_MATRIX_CACHE_TTL_DAYS: int = 7
     
     # 認証関連（後で使用）
     SECRET_KEY: str = "your-secret-key-here-change-in-production"
@@ -44,6 +44,17 @@ class CRUDGuest:
         db.refresh(db_obj)
         return db_obj
     
+    def create_multi(self, db: Session, objs_in: List[GuestCreate]) -> List[Guest]:
+        """ゲストをまとめて作成（1トランザクションで登録）"""
+        db_objs = [Guest(**obj_in.model_dump()) for obj_in in objs_in]
+        db.add_all(db_objs)
+        db.flush()
+        ids = [obj.id for obj in db_objs]
+        db.commit()
+        # コミットで失効した属性は1件ずつrefreshせず、1回のSELECTでまとめて読み直す
+        db.query(Guest).filter(Guest.id.in_(ids)).all()
+        return db_objs
+    
     def update(
         self, 
         db: Session, 
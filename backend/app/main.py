@@ -1,12 +1,18 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
 import logging
 import sys
 import os
 import traceback
 
+try:
+    import orjson  # noqa: F401
+    ORJSON_AVAILABLE = True
+except ImportError:  # orjsonが無い環境では標準のjsonで応答を生成
+    ORJSON_AVAILABLE = False
+
 # プロジェクトルートをPythonパスに追加
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -43,6 +49,9 @@ async def lifespan(app: FastAPI):
     
     # 終了時の処理
     logger.info("Shutting down application...")
+    # 最適化用のプロセスプールを停止（ワーカーとセマフォを解放）
+    from app.optimizer.route_optimizer import shutdown_process_pool
+    shutdown_process_pool()
 
 
 # FastAPIアプリケーション作成
@@ -52,6 +61,8 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=f"{settings.API_V1_STR}/docs",
     redoc_url=f"{settings.API_V1_STR}/redoc",
+    # ルート・区間の多い最適化結果を高速にシリアライズする
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse,
     lifespan=lifespan
 )
 
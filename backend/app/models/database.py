@@ -8,13 +8,32 @@ from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # orjsonが無い環境ではSQLAlchemy標準のjsonを使う
+    ORJSON_AVAILABLE = False
+
+
+def _orjson_serializer(value) -> str:
+    """JSON列の書き込み用（標準のjsonと同様に文字列以外の辞書キーも許可）"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+# JSON列（調整履歴のoriginal_data/adjusted_dataなど）の読み書きはorjsonで行う
+_json_options = (
+    {"json_serializer": _orjson_serializer, "json_deserializer": orjson.loads}
+    if ORJSON_AVAILABLE else {}
+)
+
 # データベースエンジンの作成
 engine = create_engine(
     settings.DATABASE_URL,
     # PostgreSQL用の追加設定
     pool_pre_ping=True,
     pool_size=10,
-    max_overflow=20
+    max_overflow=20,
+    **_json_options
 )
 
 # セッションファクトリ
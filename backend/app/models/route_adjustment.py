@@ -36,7 +36,7 @@ class RouteAdjustment(Base):
     
     # メタデータ
     adjusted_by = Column(String(100))
-    adjusted_at = Column(DateTime, default=datetime.utcnow)
+    adjusted_at = Column(DateTime, default=datetime.utcnow, index=True)  # 学習サービスの期間検索用
     applied = Column(Boolean, default=False)
     
     # リレーション
@@ -4,9 +4,174 @@
 """
 
 import math
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import numpy as np
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # numbaが無い環境ではNumPy実装にフォールバック
+    NUMBA_AVAILABLE = False
+
+
+EARTH_DIAMETER_KM = 12742.0  # 地球の直径（km）= 2 * 6371
+CUDA_MIN_ELEMENTS = 250_000  # GPUへの転送コストに見合う行列の要素数
+CUDA_BLOCK_SIZE = 16  # CUDAカーネルの1ブロックあたりのスレッド数（16×16）
+
+CUDA_AVAILABLE = False
+if NUMBA_AVAILABLE:
+    try:
+        from numba import cuda
+        CUDA_AVAILABLE = cuda.is_available()
+    except Exception:  # CUDAドライバが無い環境ではCPU実装のみ使う
+        CUDA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def haversine_matrix(lat, lng, out):
+        """
+        Haversine距離行列をoutに直接書き込む（Numba JIT）
+        
+        対称行列なので上三角のみ計算し、下三角へ複写する
+
+        Args:
+            lat, lng: ラジアン単位の緯度・経度配列
+            out: 書き込み先の (n, n) 配列
+        """
+        n = lat.shape[0]
+        for i in prange(n):
+            out[i, i] = 0.0
+            for j in range(i + 1, n):
+                dlat = lat[i] - lat[j]
+                dlng = lng[i] - lng[j]
+                a = (math.sin(dlat / 2) ** 2 +
+                     math.cos(lat[i]) * math.cos(lat[j]) * math.sin(dlng / 2) ** 2)
+                d = EARTH_DIAMETER_KM * math.asin(math.sqrt(a))
+                out[i, j] = d
+                out[j, i] = d
+
+    @njit(cache=True)
+    def haversine_km(lat1, lon1, lat2, lon2):
+        """2点間のHaversine距離（km、丸めなし、Numba JIT）"""
+        lat1_rad = math.radians(lat1)
+        lat2_rad = math.radians(lat2)
+        delta_lat = math.radians(lat2 - lat1)
+        delta_lon = math.radians(lon2 - lon1)
+        a = (math.sin(delta_lat / 2) ** 2 +
+             math.cos(lat1_rad) * math.cos(lat2_rad) *
+             math.sin(delta_lon / 2) ** 2)
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return 0.5 * EARTH_DIAMETER_KM * c
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def haversine_cross_matrix(o_lat, o_lng, d_lat, d_lng, speed_kmh, dist_out, dur_out):
+        """
+        出発地×目的地のHaversine距離（km）と所要時間（分）を直接書き込む（Numba JIT）
+
+        Args:
+            o_lat, o_lng: ラジアン単位の出発地の緯度・経度配列
+            d_lat, d_lng: ラジアン単位の目的地の緯度・経度配列
+            speed_kmh: 所要時間の換算に使う平均速度
+            dist_out, dur_out: 書き込み先の (n_origins, n_dests) 配列
+        """
+        minutes_per_km = 60.0 / speed_kmh
+        for i in prange(o_lat.shape[0]):
+            cos_o = math.cos(o_lat[i])
+            for j in range(d_lat.shape[0]):
+                a = (math.sin((d_lat[j] - o_lat[i]) / 2) ** 2 +
+                     cos_o * math.cos(d_lat[j]) * math.sin((d_lng[j] - o_lng[i]) / 2) ** 2)
+                d = EARTH_DIAMETER_KM * math.asin(math.sqrt(a))
+                dist_out[i, j] = d
+                dur_out[i, j] = d * minutes_per_km
+else:
+    def haversine_matrix(lat, lng, out):
+        """Haversine距離行列をoutに書き込む（NumPyフォールバック、上三角のみ計算）"""
+        i, j = np.triu_indices(lat.shape[0], k=1)
+        dlat = lat[i] - lat[j]
+        dlng = lng[i] - lng[j]
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat[i]) * np.cos(lat[j]) * np.sin(dlng / 2) ** 2
+        d = EARTH_DIAMETER_KM * np.arcsin(np.sqrt(a))
+        out.fill(0.0)
+        out[i, j] = d
+        out[j, i] = d
+
+    def haversine_km(lat1, lon1, lat2, lon2):
+        """2点間のHaversine距離（km、丸めなし）"""
+        lat1_rad = math.radians(lat1)
+        lat2_rad = math.radians(lat2)
+        delta_lat = math.radians(lat2 - lat1)
+        delta_lon = math.radians(lon2 - lon1)
+        a = (math.sin(delta_lat / 2) ** 2 +
+             math.cos(lat1_rad) * math.cos(lat2_rad) *
+             math.sin(delta_lon / 2) ** 2)
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return 0.5 * EARTH_DIAMETER_KM * c
+
+    def haversine_cross_matrix(o_lat, o_lng, d_lat, d_lng, speed_kmh, dist_out, dur_out):
+        """出発地×目的地の距離・所要時間を書き込む（NumPyフォールバック、ブロードキャスト）"""
+        a = (np.sin((d_lat[None, :] - o_lat[:, None]) / 2) ** 2 +
+             np.cos(o_lat)[:, None] * np.cos(d_lat)[None, :] *
+             np.sin((d_lng[None, :] - o_lng[:, None]) / 2) ** 2)
+        np.multiply(EARTH_DIAMETER_KM, np.arcsin(np.sqrt(a)), out=dist_out)
+        np.multiply(dist_out, 60.0 / speed_kmh, out=dur_out)
+
+
+if CUDA_AVAILABLE:
+    @cuda.jit
+    def _haversine_cross_kernel(o_lat, o_lng, d_lat, d_lng, minutes_per_km, dist_out, dur_out):
+        """1スレッドで1要素の距離・所要時間を計算（CUDA）"""
+        i, j = cuda.grid(2)
+        if i < o_lat.shape[0] and j < d_lat.shape[0]:
+            a = (math.sin((d_lat[j] - o_lat[i]) / 2) ** 2 +
+                 math.cos(o_lat[i]) * math.cos(d_lat[j]) * math.sin((d_lng[j] - o_lng[i]) / 2) ** 2)
+            d = EARTH_DIAMETER_KM * math.asin(math.sqrt(a))
+            dist_out[i, j] = d
+            dur_out[i, j] = d * minutes_per_km
+
+    @cuda.jit
+    def _haversine_kernel(lat, lng, out):
+        """1スレッドで1要素の距離を計算（CUDA、所要時間は求めない）"""
+        i, j = cuda.grid(2)
+        n = lat.shape[0]
+        if i < n and j < n:
+            a = (math.sin((lat[j] - lat[i]) / 2) ** 2 +
+                 math.cos(lat[i]) * math.cos(lat[j]) * math.sin((lng[j] - lng[i]) / 2) ** 2)
+            out[i, j] = EARTH_DIAMETER_KM * math.asin(math.sqrt(a))
+
+    def haversine_matrix_cuda(lat, lng, out):
+        """
+        haversine_matrixのGPU版（距離のみ。要素数がCUDA_MIN_ELEMENTS以上のとき用）
+        
+        結果はホスト側のoutへ複写する
+        """
+        n = out.shape[0]
+        threads = (CUDA_BLOCK_SIZE, CUDA_BLOCK_SIZE)
+        blocks = ((n + CUDA_BLOCK_SIZE - 1) // CUDA_BLOCK_SIZE,) * 2
+        out_device = cuda.device_array(out.shape, dtype=out.dtype)
+        _haversine_kernel[blocks, threads](cuda.to_device(lat), cuda.to_device(lng), out_device)
+        out_device.copy_to_host(out)
+
+    def haversine_cross_matrix_cuda(o_lat, o_lng, d_lat, d_lng, speed_kmh, dist_out, dur_out):
+        """
+        haversine_cross_matrixのGPU版（要素数がCUDA_MIN_ELEMENTS以上のとき用）
+        
+        引数はhaversine_cross_matrixと同じ。結果はホスト側のdist_out・dur_outへ複写する
+        """
+        n, m = dist_out.shape
+        threads = (CUDA_BLOCK_SIZE, CUDA_BLOCK_SIZE)
+        blocks = ((n + CUDA_BLOCK_SIZE - 1) // CUDA_BLOCK_SIZE,
+                  (m + CUDA_BLOCK_SIZE - 1) // CUDA_BLOCK_SIZE)
+        dist_device = cuda.device_array(dist_out.shape, dtype=dist_out.dtype)
+        dur_device = cuda.device_array(dur_out.shape, dtype=dur_out.dtype)
+        _haversine_cross_kernel[blocks, threads](
+            cuda.to_device(o_lat), cuda.to_device(o_lng),
+            cuda.to_device(d_lat), cuda.to_device(d_lng),
+            60.0 / speed_kmh, dist_device, dur_device
+        )
+        dist_device.copy_to_host(dist_out)
+        dur_device.copy_to_host(dur_out)
+
 
 class DistanceCalculator:
     """緯度経度ベースの距離計算クラス"""
@@ -25,19 +190,7 @@ class DistanceCalculator:
         Returns:
             距離（km）
         """
-        # 度をラジアンに変換
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        # Haversine公式
-        a = (math.sin(delta_lat / 2) ** 2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * 
-             math.sin(delta_lon / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        distance = DistanceCalculator.EARTH_RADIUS_KM * c
+        distance = haversine_km(lat1, lon1, lat2, lon2)
         return round(distance, 2)
     
     @staticmethod
@@ -51,19 +204,43 @@ class DistanceCalculator:
         Returns:
             距離行列（numpy array）
         """
-        n = len(locations)
-        matrix = np.zeros((n, n))
+        coords = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        return DistanceCalculator.create_distance_matrix_from_arrays(
+            coords[:, 0], coords[:, 1]
+        )
+    
+    @staticmethod
+    def create_distance_matrix_from_arrays(lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """
+        緯度配列・経度配列から距離行列を作成
+        
+        Args:
+            lats: 緯度の1次元配列（度）
+            lngs: 経度の1次元配列（度）
+            
+        Returns:
+            距離行列（numpy array）
+        """
+        n = len(lats)
+        matrix = np.empty((n, n), dtype=np.float64)
+        
+        if CUDA_AVAILABLE and n * n >= CUDA_MIN_ELEMENTS:
+            haversine_matrix_cuda(
+                np.ascontiguousarray(np.radians(lats)),
+                np.ascontiguousarray(np.radians(lngs)),
+                matrix
+            )
+            return np.round(matrix, 2, out=matrix)
         
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    lat1, lon1 = locations[i]
-                    lat2, lon2 = locations[j]
-                    matrix[i][j] = DistanceCalculator.haversine_distance(
-                        lat1, lon1, lat2, lon2
-                    )
+        # 連続した配列にしてからJITカーネルへ渡す
+        haversine_matrix(
+            np.ascontiguousarray(np.radians(lats)),
+            np.ascontiguousarray(np.radians(lngs)),
+            matrix
+        )
         
-        return matrix
+        # haversine_distance と同じく小数第2位で丸める
+        return np.round(matrix, 2, out=matrix)
     
     @staticmethod
     def create_time_matrix(distance_matrix: np.ndarray, 
@@ -80,7 +257,27 @@ class DistanceCalculator:
         """
         # 時間 = 距離 / 速度 * 60（分に変換）
         time_matrix = (distance_matrix / average_speed_kmh) * 60
-        return np.round(time_matrix).astype(int)
+        return np.round(time_matrix).astype(np.int32)
+
+
+_distance_calculator: Optional[DistanceCalculator] = None
+
+
+def get_distance_calculator() -> DistanceCalculator:
+    """DistanceCalculatorを遅延初期化（プロセス内で共有）"""
+    global _distance_calculator
+    if _distance_calculator is None:
+        _distance_calculator = DistanceCalculator()
+    return _distance_calculator
+
+
+# JITコンパイルのコストを起動時に支払っておく
+if NUMBA_AVAILABLE:
+    haversine_matrix(np.zeros(2), np.zeros(2), np.empty((2, 2)))
+    haversine_matrix(np.zeros(2), np.zeros(2), np.empty((2, 2), dtype=np.float32))
+    haversine_km(0.0, 0.0, 0.0, 0.0)
+    haversine_cross_matrix(np.zeros(1), np.zeros(1), np.zeros(1), np.zeros(1), 30.0,
+                           np.empty((1, 1), dtype=np.float32), np.empty((1, 1), dtype=np.float32))
 
 
 # 石垣島の主要地点サンプルデータ
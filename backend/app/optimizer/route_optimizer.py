@@ -5,7 +5,15 @@ OR-Toolsを使用した石垣島ツアーのルート最適化
 """
 
 from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import lru_cache
+from time import monotonic
+import asyncio
+import atexit
+import multiprocessing
+import os
 import logging
+import threading
 from datetime import time, datetime, timedelta
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
@@ -13,23 +21,134 @@ import numpy as np
 
 from app.schemas.optimization import (
     Guest, Vehicle, Location, OptimizationRequest,
-    VehicleRoute, RouteSegment, OptimizationResult
+    VehicleRoute, RouteSegment, OptimizationResult, build_indexes
 )
-from app.optimizer.distance_calculator import DistanceCalculator
-from app.services.google_maps_service import GoogleMapsService
+from app.core.config import settings
+from app.optimizer.distance_calculator import DistanceCalculator, get_distance_calculator
+from app.services.google_maps_service import get_google_maps_service
+from app.services.matrix_cache import get_distance_matrix_cache
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=128)
+def _cached_matrices(locations: Tuple[Tuple[float, float], ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    距離行列・時間行列をプロセス内でキャッシュ
+    
+    Args:
+        locations: 丸めた座標のタプル（行列の並び順どおり）
+    """
+    distance_matrix = DistanceCalculator.create_distance_matrix(list(locations))
+    time_matrix = DistanceCalculator.create_time_matrix(distance_matrix)
+    
+    # キャッシュ共有のため読み取り専用にする
+    distance_matrix.flags.writeable = False
+    time_matrix.flags.writeable = False
+    return distance_matrix, time_matrix
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+# プールを使う求解は同時に1件まで（後続の並列求解は順番待ちせず呼び出し元で解く）
+_process_pool_lock = threading.Lock()
+
+
+def _process_pool_size() -> int:
+    """プロセスプールのワーカー数（並列求解の戦略数とCPU数の小さい方）"""
+    return max(1, min(len(RouteOptimizer.SOLVER_PORTFOLIO), os.cpu_count() or 1))
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """部分問題の求解用プロセスプールを遅延初期化（プロセス内で共有）"""
+    global _process_pool
+    if _process_pool is None:
+        # Numbaのスレッドプールはfork非対応のため、forkserver（無ければspawn）で起動
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        _process_pool = ProcessPoolExecutor(max_workers=_process_pool_size(), mp_context=context)
+    return _process_pool
+
+
+def _release_process_pool_after(futures: List) -> None:
+    """実行中の求解がすべて終わってからプールの使用権を返す"""
+    wait(futures)
+    _process_pool_lock.release()
+
+
+def shutdown_process_pool() -> None:
+    """プロセスプールを停止（アプリ終了時に呼ぶ。未使用なら何もしない）"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+atexit.register(shutdown_process_pool)
+
+
+def _kmeans_labels(coords: np.ndarray, k: int, iterations: int = 20) -> np.ndarray:
+    """
+    座標をk個のクラスタに分割（k-means、NumPy実装）
+    
+    Args:
+        coords: (n, 2) の緯度経度配列
+        k: クラスタ数
+        
+    Returns:
+        各座標のクラスタ番号
+    """
+    rng = np.random.default_rng(0)  # 結果を再現可能にする
+    centers = coords[rng.choice(len(coords), size=k, replace=False)]
+    labels = np.zeros(len(coords), dtype=np.intp)
+    
+    for _ in range(iterations):
+        sq_dist = ((coords[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = sq_dist.argmin(axis=1)
+        new_centers = np.array([
+            coords[labels == c].mean(axis=0) if np.any(labels == c) else centers[c]
+            for c in range(k)
+        ])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+    
+    return labels
+
+
 class RouteOptimizer:
     """ルート最適化クラス"""
     
+    TIME_ORIGIN_MINUTES = 6 * 60  # 時間窓の起点（06:00）
+    TIME_HORIZON_MINUTES = 600  # 起点から10時間
+    WARM_START_TIME_LIMIT_SECONDS = 5  # 初期解がある場合の探索時間
+    SOLUTION_STALL_SECONDS = 1.0  # この時間改善がなければ探索を打ち切る
+    CLUSTER_GUEST_THRESHOLD = 40  # これを超えるゲスト数は地域ごとに分割して解く
+    CLUSTER_TARGET_SIZE = 20  # 1クラスタあたりの目安ゲスト数
+    PORTFOLIO_GRACE_SECONDS = 5  # 並列求解で探索時間の上限を超えて待つ猶予
+    TIME_WINDOW_PENALTY_PER_MINUTE = 1000  # 希望時間帯の終了から1分遅れるごとのコスト（距離1km相当）
+    PRUNED_ARC_PENALTY_KM = 1000.0  # 最大距離の制約で問い合わせなかった組の距離（実質的に使わせない）
+    # 並列求解で試す（初期解戦略, メタヒューリスティック）の組み合わせ
+    SOLVER_PORTFOLIO = [
+        (routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH),
+        (routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION,
+         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH),
+        (routing_enums_pb2.FirstSolutionStrategy.SAVINGS,
+         routing_enums_pb2.LocalSearchMetaheuristic.GENERIC_TABU_SEARCH),
+        (routing_enums_pb2.FirstSolutionStrategy.CHRISTOFIDES,
+         routing_enums_pb2.LocalSearchMetaheuristic.SIMULATED_ANNEALING),
+    ]
+    DEPOT_LOCATION = Location(name="デポ", lat=24.3448, lng=124.1572)  # 車両基地（石垣島の中心）
+    
     def __init__(self):
-        self.distance_calculator = DistanceCalculator()
-        self.google_maps_service = GoogleMapsService()
+        # サービスはプロセス内で共有（Google Mapsクライアントの接続を再利用）
+        self.distance_calculator = get_distance_calculator()
+        self.google_maps_service = get_google_maps_service()
         self.solution_strategies = {
             'safety': routing_enums_pb2.FirstSolutionStrategy.PATH_MOST_CONSTRAINED_ARC,
-            'efficiency': routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC,
+            'efficiency': routing_enums_pb2.FirstSolutionStrategy.AUTOMATIC,
             'balanced': routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
         }
         self.weather_service = None  # 遅延初期化
@@ -52,47 +171,147 @@ class RouteOptimizer:
         start_time = datetime.now()
         
         try:
+            # ゲスト1名の自明な問題はOR-Toolsを起動せずに割り当てる
+            # （2名以上は訪問順で走行時間が変わるため、小さくてもソルバーで解く）
+            if len(guests) <= 1:
+                logger.info("Trivial problem size, using simple assignment")
+                return self._create_simple_solution(request, guests, vehicles, start_time)
+            
+            # 大規模なツアーは地域ごとに分割して並列に解く
+            # （初期解のノード番号は全体の問題に対するものなので、指定時は分割しない）
+            if (len(guests) > self.CLUSTER_GUEST_THRESHOLD and len(vehicles) > 1
+                    and not request.initial_routes):
+                result = self._optimize_clustered(request, guests, vehicles, start_time)
+                if result:
+                    return result
+                logger.warning("Clustered optimization failed, solving as a single problem")
+            
             # データ準備（Google Maps API対応版を使用）
-            data = self._prepare_data_async(request, guests, vehicles)
+            data = self._prepare_data_with_google_maps(request, guests, vehicles)
             
             # デバッグ情報
             logger.info(f"Optimization problem size:")
             logger.info(f"  - Guests: {len(guests)}")
             logger.info(f"  - Vehicles: {len(vehicles)}")
-            logger.info(f"  - Total capacity: {sum(data['vehicle_capacities'])}")
-            logger.info(f"  - Total demand: {sum(data['demands'])}")
+            total_capacity = int(data['vehicle_capacities_array'].sum())
+            total_demand = int(data['demands_array'].sum())
+            logger.info(f"  - Total capacity: {total_capacity}")
+            logger.info(f"  - Total demand: {total_demand}")
             
             # 実行可能性チェック
-            if sum(data['demands']) > sum(data['vehicle_capacities']):
+            if total_demand > total_capacity:
                 logger.warning("Total demand exceeds total capacity!")
                 return self._create_simple_solution(request, guests, vehicles, start_time)
             
             # OR-Toolsで最適化を実行、失敗したらシンプルな割り当て
-            solution = self._solve_vrp(data, request.optimization_strategy)
+            # 複数CPUがあれば探索戦略を並列に試す（初期解がある場合は局所改善のみ）
+            if not request.initial_routes and (os.cpu_count() or 1) > 1:
+                solution = self._solve_vrp_portfolio(
+                    data, request.optimization_strategy, request.time_limit_seconds
+                )
+            else:
+                # 初期解の指定がなければシンプルな割り当てから改善を始める
+                solution = self._solve_vrp(
+                    data, request.optimization_strategy, request.time_limit_seconds,
+                    self._request_initial_routes(request, data) or self._simple_initial_routes(data)
+                )
             
             # 解が見つからない、または空のルートの場合はシンプルな割り当てを使用
             if not solution or all(len(r['route']) <= 2 for r in solution.get('routes', [])):
                 logger.warning("No valid solution found by OR-Tools, using simple assignment")
                 return self._create_simple_solution(request, guests, vehicles, start_time)
-                # 結果を整形
-                result = self._format_solution(
-                    data, solution, request, guests, vehicles
-                )
-                computation_time = (datetime.now() - start_time).total_seconds()
-                result.computation_time_seconds = computation_time
-                
-                logger.info(f"最適化成功: {len(result.routes)}台で{len(guests)}名をピックアップ")
-                return result
-            else:
-                logger.warning("No solution found, using simple assignment")
-                return self._create_simple_solution(request, guests, vehicles, start_time)
+            
+            # 結果を整形
+            result = self._format_solution(
+                data, solution, request, guests, vehicles
+            )
+            computation_time = (datetime.now() - start_time).total_seconds()
+            result.computation_time_seconds = computation_time
+            result.optimization_metrics["computation_time_seconds"] = computation_time
+            
+            logger.info(f"最適化成功: {len(result.routes)}台で{len(guests)}名をピックアップ")
+            return result
                 
         except Exception as e:
             logger.error(f"最適化エラー: {str(e)}")
             return self._create_simple_solution(request, guests, vehicles, start_time)
     
-    def _solve_vrp(self, data: Dict, strategy: str) -> Optional[Dict]:
-        """OR-Toolsで車両ルート問題を解く"""
+    async def optimize_async(self,
+                             request: OptimizationRequest,
+                             guests: List[Guest],
+                             vehicles: List[Vehicle]) -> OptimizationResult:
+        """
+        optimizeをワーカースレッドで実行（非同期ハンドラーから呼ぶ用）
+        
+        OR-Toolsの探索中はGILが解放されるため、イベントループを止めずに待てる
+        """
+        return await asyncio.to_thread(self.optimize, request, guests, vehicles)
+    
+    def _solve_vrp_portfolio(self, data: Dict, strategy: str,
+                             time_limit_seconds: Optional[int] = None) -> Optional[Dict]:
+        """複数の探索戦略を別プロセスで同時に実行し、目的関数値（距離＋時間窓ペナルティ）が最小の解を採用"""
+        requested = (
+            self.solution_strategies.get(
+                strategy, routing_enums_pb2.FirstSolutionStrategy.AUTOMATIC
+            ),
+            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        )
+        portfolio = [requested] + [c for c in self.SOLVER_PORTFOLIO if c != requested]
+        # ワーカー数を超える戦略は順番待ちになり、全体の時間が延びるため試さない
+        portfolio = portfolio[:_process_pool_size()]
+        
+        initial_routes = self._simple_initial_routes(data)
+        
+        # 他のリクエストがプールを使用中なら、順番待ちで時間切れにならないようこのスレッドで解く
+        if not _process_pool_lock.acquire(blocking=False):
+            logger.info("Process pool busy, solving in the calling thread")
+            return self._solve_vrp(data, strategy, time_limit_seconds, initial_routes)
+        
+        running = []
+        try:
+            pool = _get_process_pool()
+            # 指定された戦略はシンプルな割り当てから改善し、他の戦略は初期解から探索する
+            futures = [
+                pool.submit(_solve_with_strategy, data, strategy, time_limit_seconds,
+                            first_solution_strategy, metaheuristic,
+                            initial_routes if i == 0 else None)
+                for i, (first_solution_strategy, metaheuristic) in enumerate(portfolio)
+            ]
+            # 各戦略はすぐに開始されるので、探索時間の上限＋猶予を過ぎたものは結果を使わない
+            # （cancelで止まるのは未開始のものだけで、実行中の探索は時間制限で終わる）
+            done, not_done = wait(
+                futures,
+                timeout=(time_limit_seconds or settings.OPTIMIZATION_TIME_LIMIT_SECONDS)
+                + self.PORTFOLIO_GRACE_SECONDS
+            )
+            running = [future for future in not_done if not future.cancel()]
+        finally:
+            # 実行中の戦略が残っていれば、終わるまでプールは使用中のままにする
+            if running:
+                threading.Thread(
+                    target=_release_process_pool_after, args=(running,), daemon=True
+                ).start()
+            else:
+                _process_pool_lock.release()
+        solutions = [future.result() for future in futures if future in done]
+        solutions = [solution for solution in solutions if solution]
+        
+        logger.info(f"Portfolio solve: {len(solutions)}/{len(portfolio)} strategies found a solution")
+        return min(solutions, key=lambda solution: solution['objective'], default=None)
+    
+    def _solve_vrp(self, data: Dict, strategy: str,
+                   time_limit_seconds: Optional[int] = None,
+                   initial_routes: Optional[List[List[int]]] = None,
+                   first_solution_strategy: Optional[int] = None,
+                   metaheuristic: Optional[int] = None) -> Optional[Dict]:
+        """
+        OR-Toolsで車両ルート問題を解く
+        
+        Args:
+            initial_routes: 初期解（車両ごとの訪問ノード番号列、デポを除く）
+            first_solution_strategy: 初期解の戦略（省略時はstrategyから決定）
+            metaheuristic: 局所探索のメタヒューリスティック（省略時はGLS）
+        """
         
         try:
             # シンプルなルーティングモデルを作成（開始・終了は同じデポ）
@@ -102,23 +321,22 @@ class RouteOptimizer:
                 data['depot']
             )
             
-            routing = pywrapcp.RoutingModel(manager)
+            # 全車両が同じコスト構造なので車両別コストモデルを集約
+            model_parameters = pywrapcp.DefaultRoutingModelParameters()
+            model_parameters.reduce_vehicle_cost_model = True
             
-            # 距離のコールバック
-            def distance_callback(from_index, to_index):
-                from_node = manager.IndexToNode(from_index)
-                to_node = manager.IndexToNode(to_index)
-                return int(data['distance_matrix'][from_node][to_node] * 1000)
+            routing = pywrapcp.RoutingModel(manager, model_parameters)
             
-            transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+            # 距離・需要・時間は行列/ベクトルとしてC++側に登録し、
+            # 探索中にPythonのコールバックを呼ばないようにする
+            # 距離（メートル単位の整数行列）
+            transit_callback_index = routing.RegisterTransitMatrix(
+                data['distance_matrix_m'].tolist()
+            )
             routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
             
             # 容量制約
-            def demand_callback(from_index):
-                from_node = manager.IndexToNode(from_index)
-                return data['demands'][from_node]
-            
-            demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
+            demand_callback_index = routing.RegisterUnaryTransitVector(data['demands'])
             routing.AddDimensionWithVehicleCapacity(
                 demand_callback_index,
                 0,
@@ -127,45 +345,90 @@ class RouteOptimizer:
                 'Capacity'
             )
             
-            # 時間制約
-            def time_callback(from_index, to_index):
-                from_node = manager.IndexToNode(from_index)
-                to_node = manager.IndexToNode(to_index)
-                travel_time = data['time_matrix'][from_node][to_node]
-                service_time = data['service_time'] if from_node != data['depot'] else 0
-                return travel_time + service_time
-            
-            time_callback_index = routing.RegisterTransitCallback(time_callback)
+            # 時間制約（サービス時間込みの行列、06:00起点の分）
+            # 結果の時刻は出発時刻からの移動時間の累積で求めるため、待機は入れない
+            time_callback_index = routing.RegisterTransitMatrix(
+                data['time_matrix_with_service'].tolist()
+            )
+            departure_offset = data['departure_offset']
             routing.AddDimension(
                 time_callback_index,
-                300,  # 最大待機時間
-                600,  # 最大総時間
+                0,  # 最大待機時間
+                departure_offset + self.TIME_HORIZON_MINUTES,  # 出発から最大10時間
                 False,
                 'Time'
             )
+            time_dimension = routing.GetDimensionOrDie('Time')
             
-            # シンプルな制約設定
-            # ゲストのピックアップを必須にする（ペナルティなし = 必須）
-            for node in range(1, data['destination']):
-                routing.AddDisjunction([manager.NodeToIndex(node)], 0)  # ペナルティ0 = 必須
+            # 全車両がリクエストの出発時刻にデポを出る
+            for vehicle_id in range(data['num_vehicles']):
+                time_dimension.CumulVar(routing.Start(vehicle_id)).SetRange(
+                    departure_offset, departure_offset
+                )
+            
+            # ゲストの希望時間帯の終了はソフト制約（遅れた分だけコストを加算し、解なしにはしない）
+            # 待機を入れないため開始より早い到着は制約せず、その場で待ってもらう扱い
+            for node, (_, window_end) in enumerate(data['time_windows']):
+                if 0 < node < data['destination'] and window_end < self.TIME_HORIZON_MINUTES:
+                    time_dimension.SetCumulVarSoftUpperBound(
+                        manager.NodeToIndex(node), window_end, self.TIME_WINDOW_PENALTY_PER_MINUTE
+                    )
             
-            # 目的地への訪問も必須（最後に訪問）
-            routing.AddDisjunction([manager.NodeToIndex(data['destination'])], 0)
+            # ゲストのピックアップと目的地への訪問は必須
+            # （Disjunctionを追加しないノードは必ず訪問される）
             
             # 検索パラメータ
             search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-            search_parameters.first_solution_strategy = self.solution_strategies.get(
-                strategy, routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+            search_parameters.first_solution_strategy = (
+                first_solution_strategy or self.solution_strategies.get(
+                    strategy, routing_enums_pb2.FirstSolutionStrategy.AUTOMATIC
+                )
             )
             search_parameters.local_search_metaheuristic = (
-                routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+                metaheuristic or routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+            )
+            # 問題規模（ゲスト数）に応じて上限を決める
+            # 初期解がある場合は局所改善だけで済むため短めに打ち切る
+            default_time_limit = min(
+                settings.OPTIMIZATION_TIME_LIMIT_SECONDS,
+                max(2, len(data['guest_data']) // 2)
             )
-            search_parameters.time_limit.seconds = 30
-            search_parameters.log_search = True
+            if initial_routes:
+                default_time_limit = min(default_time_limit, self.WARM_START_TIME_LIMIT_SECONDS)
+            search_parameters.time_limit.seconds = time_limit_seconds or default_time_limit
+            # 探索ログはDEBUG時のみ（GLSでは改善ごとに大量に出力される）
+            search_parameters.log_search = logger.isEnabledFor(logging.DEBUG)
+            
+            # 一定時間コストが改善しなければ時間制限を待たずに終了
+            # （improvement_limit_parametersはGLSでは効かないためコールバックで判定）
+            best = {'cost': None, 'at': monotonic()}
+            
+            def stop_when_stalled():
+                cost = routing.CostVar().Value()
+                now = monotonic()
+                if best['cost'] is None or cost < best['cost']:
+                    best['cost'], best['at'] = cost, now
+                elif now - best['at'] > self.SOLUTION_STALL_SECONDS:
+                    routing.solver().FinishCurrentSearch()
+            
+            routing.AddAtSolutionCallback(stop_when_stalled)
+            
+            # 初期解（前回の結果など）を読み込む
+            initial_assignment = None
+            if initial_routes:
+                routing.CloseModelWithParameters(search_parameters)
+                initial_assignment = routing.ReadAssignmentFromRoutes(initial_routes, True)
+                if not initial_assignment:
+                    logger.warning("Initial routes are infeasible, solving from scratch")
             
             # 求解
             logger.info("Starting OR-Tools solver...")
-            solution = routing.SolveWithParameters(search_parameters)
+            if initial_assignment:
+                solution = routing.SolveFromAssignmentWithParameters(
+                    initial_assignment, search_parameters
+                )
+            else:
+                solution = routing.SolveWithParameters(search_parameters)
             
             if solution:
                 logger.info("Solution found!")
@@ -176,6 +439,136 @@ class RouteOptimizer:
             
         return None
     
+    def _request_initial_routes(self, request: OptimizationRequest,
+                                data: Dict) -> Optional[List[List[int]]]:
+        """
+        リクエストの初期解（ゲストのノード番号のみ）をOR-Tools用に整える
+        
+        車両数に合わせて空のルートを補い、目的地は最初の車両の最後に訪問する
+        
+        Returns:
+            車両ごとの訪問ノード番号列。指定が無いか車両数に合わなければNone
+        """
+        if not request.initial_routes:
+            return None
+        if len(request.initial_routes) > data['num_vehicles']:
+            logger.warning("Initial routes exceed the available vehicles, ignoring them")
+            return None
+        routes = [list(route) for route in request.initial_routes]
+        routes += [[] for _ in range(data['num_vehicles'] - len(routes))]
+        routes[0].append(data['destination'])
+        return routes
+    
+    def _simple_initial_routes(self, data: Dict) -> Optional[List[List[int]]]:
+        """
+        シンプルな割り当てと同じ手順でOR-Tools用の初期解を作成
+        
+        容量の大きい車両から順にゲストを詰め、目的地は最初の車両の最後に訪問する
+        
+        Returns:
+            車両ごとの訪問ノード番号列（デポを除く）。全員を乗せられなければNone
+        """
+        capacities = data['vehicle_capacities']
+        demands = data['demands']
+        routes = [[] for _ in range(data['num_vehicles'])]
+        loads = [0] * data['num_vehicles']
+        vehicle_order = sorted(range(data['num_vehicles']), key=lambda v: -capacities[v])
+        
+        for node in range(1, data['destination']):
+            vehicle_id = next(
+                (v for v in vehicle_order if loads[v] + demands[node] <= capacities[v]),
+                None
+            )
+            if vehicle_id is None:
+                return None
+            routes[vehicle_id].append(node)
+            loads[vehicle_id] += demands[node]
+        
+        routes[vehicle_order[0]].append(data['destination'])
+        return routes
+    
+    def _optimize_clustered(self,
+                            request: OptimizationRequest,
+                            guests: List[Guest],
+                            vehicles: List[Vehicle],
+                            start_time: datetime) -> Optional[OptimizationResult]:
+        """ゲストを地域クラスタに分け、クラスタごとの部分問題を別プロセスで解いて結合"""
+        coords = np.array(
+            [(g.pickup_location.lat, g.pickup_location.lng) for g in guests],
+            dtype=np.float64
+        )
+        k = min(len(vehicles), -(-len(guests) // self.CLUSTER_TARGET_SIZE))
+        labels = _kmeans_labels(coords, k)
+        
+        clusters = [np.flatnonzero(labels == c).tolist() for c in range(k)]
+        clusters = [members for members in clusters if members]
+        demands = [sum(guests[i].total_passengers for i in members) for members in clusters]
+        
+        # 車両を大きい順に、残り需要が最も大きいクラスタへ割り当てる
+        remaining = list(demands)
+        cluster_vehicles: List[List[Vehicle]] = [[] for _ in clusters]
+        for vehicle in sorted(vehicles, key=lambda v: v.total_capacity, reverse=True):
+            c = max(range(len(clusters)),
+                    key=lambda c: (not cluster_vehicles[c], remaining[c]))
+            if cluster_vehicles[c] and remaining[c] <= 0:
+                break
+            cluster_vehicles[c].append(vehicle)
+            remaining[c] -= vehicle.total_capacity
+        
+        if any(r > 0 for r in remaining):
+            logger.warning("Vehicle capacity could not be split across clusters")
+            return None
+        
+        # 部分問題のデータを用意して並列に求解
+        sub_problems = []
+        for members, sub_vehicles in zip(clusters, cluster_vehicles):
+            sub_guests = [guests[i] for i in members]
+            sub_problems.append((
+                self._prepare_data_with_google_maps(request, sub_guests, sub_vehicles),
+                sub_guests, sub_vehicles
+            ))
+        
+        logger.info(f"Solving {len(sub_problems)} clusters in parallel")
+        with _process_pool_lock:
+            solutions = list(_get_process_pool().map(
+                _solve_cluster,
+                [data for data, _, _ in sub_problems],
+                [request.optimization_strategy] * len(sub_problems),
+                [request.time_limit_seconds] * len(sub_problems)
+            ))
+        
+        if not all(solutions):
+            return None
+        
+        # クラスタごとの結果を結合
+        results = [
+            self._format_solution(data, solution, request, sub_guests, sub_vehicles)
+            for (data, sub_guests, sub_vehicles), solution in zip(sub_problems, solutions)
+        ]
+        routes = [route for result in results for route in result.routes]
+        total_distance = sum(result.total_distance_km for result in results)
+        computation_time = (datetime.now() - start_time).total_seconds()
+        
+        merged = results[0]
+        merged.status = "success" if routes else "failed"
+        merged.total_vehicles_used = len(routes)
+        merged.routes = routes
+        merged.total_distance_km = round(total_distance, 2)
+        merged.total_time_minutes = max(result.total_time_minutes for result in results)
+        merged.average_efficiency_score = (
+            sum(r.efficiency_score for r in routes) / len(routes) if routes else 0
+        )
+        merged.optimization_metrics.update({
+            "total_guests": len(guests),
+            "total_vehicles_available": len(vehicles),
+            "clusters": len(sub_problems),
+            "computation_time_seconds": computation_time
+        })
+        merged.computation_time_seconds = computation_time
+        
+        logger.info(f"最適化成功: {len(routes)}台で{len(guests)}名をピックアップ（{len(sub_problems)}クラスタ）")
+        return merged
+    
     def _create_simple_solution(self, request: OptimizationRequest, 
                                guests: List[Guest], 
                                vehicles: List[Vehicle],
@@ -202,83 +595,98 @@ class RouteOptimizer:
                                key=lambda v: v.capacity_adults + v.capacity_children, 
                                reverse=True)
         
+        # 全地点間の距離を一度に計算（0: デポ、1〜N: ゲスト、N+1: 目的地）
+        coords, _ = self._collect_locations(request, guests)
+        distances = DistanceCalculator.create_distance_matrix_from_arrays(
+            coords[:, 0], coords[:, 1]
+        ).tolist()
+        destination_idx = len(guests) + 1
+        base_time = datetime.combine(request.tour_date, request.departure_time)
+        
         routes = []
-        assigned_guests = set()
+        # 割り当て済みフラグ（ゲストIDのハッシュではなく位置で管理）
+        assigned_mask = np.zeros(len(guests), dtype=bool)
+        assigned_count = 0
         
         for vehicle in sorted_vehicles:
-            if len(assigned_guests) >= len(guests):
+            if assigned_count >= len(guests):
                 break
                 
             route_segments = []
+            # 集計用に区間の距離・所要時間を列として並行して保持
+            segment_distances = []
+            segment_durations = []
             vehicle_guests = []
             current_capacity = 0
             max_capacity = vehicle.capacity_adults + vehicle.capacity_children
             
             # デポから開始
-            current_location = Location(name="デポ", lat=24.3448, lng=124.1572)
-            current_time = datetime.combine(request.tour_date, request.departure_time)
+            current_location = self.DEPOT_LOCATION
+            current_idx = 0
+            current_minutes = 0  # 出発からの経過分（時刻への変換はセグメント作成時のみ）
             
             # ゲストをピックアップ
-            for guest in guests:
-                if guest.id in assigned_guests:
+            for guest_idx, guest in enumerate(guests, start=1):
+                if assigned_mask[guest_idx - 1]:
                     continue
                     
                 guest_demand = guest.num_adults + guest.num_children
                 if current_capacity + guest_demand <= max_capacity:
                     # ピックアップセグメントを追加
-                    distance = DistanceCalculator.haversine_distance(
-                        current_location.lat, current_location.lng,
-                        guest.pickup_location.lat, guest.pickup_location.lng
-                    )
+                    distance = distances[current_idx][guest_idx]
                     duration = int(distance * 2)  # 簡易的な時間計算
                     
-                    arrival_time = current_time + timedelta(minutes=duration)
-                    departure_time = arrival_time + timedelta(minutes=5)
+                    arrival_minutes = current_minutes + duration
+                    departure_minutes = arrival_minutes + 5
                     
-                    segment = RouteSegment(
+                    # 内部で組み立てた値なので検証を省略（APIの応答時に検証される）
+                    segment = RouteSegment.model_construct(
                         from_location=current_location,
                         to_location=guest.pickup_location,
                         guest_id=str(guest.id),
                         distance_km=round(distance, 2),
                         duration_minutes=duration,
-                        arrival_time=arrival_time.time(),
-                        departure_time=departure_time.time()
+                        arrival_time=(base_time + timedelta(minutes=arrival_minutes)).time(),
+                        departure_time=(base_time + timedelta(minutes=departure_minutes)).time()
                     )
                     
                     route_segments.append(segment)
+                    segment_distances.append(segment.distance_km)
+                    segment_durations.append(duration)
                     vehicle_guests.append(str(guest.id))
-                    assigned_guests.add(guest.id)
+                    assigned_mask[guest_idx - 1] = True
+                    assigned_count += 1
                     current_capacity += guest_demand
                     current_location = guest.pickup_location
-                    current_time = departure_time
+                    current_idx = guest_idx
+                    current_minutes = departure_minutes
             
             # 目的地へのセグメントを追加
             if vehicle_guests:
-                distance = DistanceCalculator.haversine_distance(
-                    current_location.lat, current_location.lng,
-                    request.destination.lat, request.destination.lng
-                )
+                distance = distances[current_idx][destination_idx]
                 duration = int(distance * 2)
                 
-                arrival_time = current_time + timedelta(minutes=duration)
+                arrival_time = (base_time + timedelta(minutes=current_minutes + duration)).time()
                 
-                segment = RouteSegment(
+                segment = RouteSegment.model_construct(
                     from_location=current_location,
                     to_location=request.destination,
                     guest_id=None,
                     distance_km=round(distance, 2),
                     duration_minutes=duration,
-                    arrival_time=arrival_time.time(),
-                    departure_time=arrival_time.time()
+                    arrival_time=arrival_time,
+                    departure_time=arrival_time
                 )
                 
                 route_segments.append(segment)
+                segment_distances.append(segment.distance_km)
+                segment_durations.append(duration)
                 
                 # ルートを作成
-                total_distance = sum(s.distance_km for s in route_segments)
-                total_duration = sum(s.duration_minutes for s in route_segments)
+                total_distance = sum(segment_distances)
+                total_duration = sum(segment_durations)
                 
-                route = VehicleRoute(
+                route = VehicleRoute.model_construct(
                     vehicle_id=str(vehicle.id),
                     vehicle_name=vehicle.name,
                     route_segments=route_segments,
@@ -294,7 +702,7 @@ class RouteOptimizer:
         # 結果を返す
         return OptimizationResult(
             tour_id=request.tour_id or f"tour_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            status="success" if len(assigned_guests) == len(guests) else "partial",
+            status="success" if assigned_count == len(guests) else "partial",
             total_vehicles_used=len(routes),
             routes=routes,
             total_distance_km=sum(r.total_distance_km for r in routes),
@@ -304,100 +712,224 @@ class RouteOptimizer:
                 "computation_time_seconds": (datetime.now() - start_time).total_seconds(),
                 "solution_type": "simple_fallback",
                 "total_guests": len(guests),
-                "assigned_guests": len(assigned_guests)
+                "assigned_guests": assigned_count
             },
             warnings=["シンプルな割り当てを使用しました"],
             computation_time_seconds=(datetime.now() - start_time).total_seconds()
         )
     
-    def _prepare_data_async(self, 
-                      request: OptimizationRequest,
-                      guests: List[Guest],
-                      vehicles: List[Vehicle]) -> Dict:
-        """非同期版のデータ準備（同期的に呼び出し）"""
-        import asyncio
-        
-        # 新しいイベントループを作成して実行
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                self._prepare_data_with_google_maps(request, guests, vehicles)
-            )
-        finally:
-            loop.close()
-    
-    async def _prepare_data_with_google_maps(
+    def _prepare_data_with_google_maps(
         self,
         request: OptimizationRequest,
         guests: List[Guest],
         vehicles: List[Vehicle]
     ) -> Dict:
-        """Google Maps APIを使用したデータ準備"""
-        # 位置情報を抽出
-        locations = []
-        location_names = []
+        """
+        ソルバー用データを準備（同期処理、イベントループ不要）
+        
+        Google Maps APIが有効なら道路距離を、未設定ならHaversine距離を使う
+        """
+        coords, location_names = self._collect_locations(request, guests)
+        distance_matrix, time_matrix = self._get_matrices(request, coords)
+        return self._build_common_data(
+            request, guests, vehicles, coords, location_names,
+            distance_matrix, time_matrix
+        )
+    
+    def _collect_locations(
+        self,
+        request: OptimizationRequest,
+        guests: List[Guest]
+    ) -> Tuple[np.ndarray, List[str]]:
+        """
+        デポ・ゲストのピックアップ地点・目的地の座標 (N, 2) と名称を並べる
+        
+        列優先で確保するため coords[:, 0]（緯度）と coords[:, 1]（経度）は
+        それぞれ連続した配列になる
+        """
+        coords = np.empty((len(guests) + 2, 2), dtype=np.float64, order='F')
         
         # デポ（仮想的な開始地点）
-        depot_location = (24.3448, 124.1572)  # 石垣島の中心
-        locations.append(depot_location)
-        location_names.append("デポ")
+        coords[0] = (24.3448, 124.1572)  # 石垣島の中心
         
         # ゲストのピックアップ地点
-        for guest in guests:
-            locations.append((guest.pickup_location.lat, guest.pickup_location.lng))
-            location_names.append(guest.pickup_location.name)
+        coords[1:-1, 0] = [guest.pickup_location.lat for guest in guests]
+        coords[1:-1, 1] = [guest.pickup_location.lng for guest in guests]
         
         # 目的地（最後に追加）
-        locations.append((request.destination.lat, request.destination.lng))
-        location_names.append(request.destination.name)
-        
-        # 距離行列を計算
-        distance_matrix = DistanceCalculator.create_distance_matrix(locations)
+        coords[-1] = (request.destination.lat, request.destination.lng)
         
-        # 時間行列（距離から推定: 平均速度30km/h）
-        time_matrix = DistanceCalculator.create_time_matrix(distance_matrix)
+        location_names = (
+            ["デポ"]
+            + [guest.pickup_location.name for guest in guests]
+            + [request.destination.name]
+        )
+        return coords, location_names
+    
+    def _get_matrices(
+        self,
+        request: OptimizationRequest,
+        coords: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """距離行列・時間行列を取得（Google Maps、未設定ならHaversine）"""
+        if self.google_maps_service.enabled:
+            departure = datetime.combine(request.tour_date, request.departure_time)
+            # 過去の日時は現在の交通状況で取得するため、曜日・時間帯のキーでは保存しない
+            if departure <= datetime.now():
+                departure = None
+            
+            # 同じ座標・曜日・時間帯の行列はディスクキャッシュから再利用
+            cache = get_distance_matrix_cache()
+            cache_key = None
+            if departure is not None:
+                departure_hour = request.departure_time.replace(minute=0, second=0).isoformat()
+                cache_key = cache.make_key(coords, departure.weekday(), departure_hour)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            # 実際の道路距離・所要時間を取得
+            # 最大距離の制約があれば、直線距離でそれを超える組はAPIに問い合わせない
+            max_driving_minutes = None
+            if request.constraints.max_distance_km is not None:
+                max_driving_minutes = (
+                    request.constraints.max_distance_km
+                    / self.google_maps_service.MAX_SPEED_KMH * 60
+                )
+            distance_matrix, time_matrix, complete = self._fetch_google_maps_matrices(
+                coords, departure, max_driving_minutes
+            )
+            # API エラーでHaversineに置き換えた部分を含む行列は保存しない
+            if complete and cache_key is not None:
+                cache.set(cache_key, distance_matrix, time_matrix)
+            return distance_matrix, time_matrix
         
-        # ゲストの需要（大人＋子供の数）
-        demands = [0]  # デポの需要は0
-        for guest in guests:
-            demands.append(guest.num_adults + guest.num_children)
-        demands.append(0)  # 目的地の需要は0
+        # 距離行列・時間行列（平均速度30km/h）を計算
+        # 座標を小数第4位（約10m）で丸めてキャッシュキーにする
+        matrix_key = tuple(map(tuple, np.round(coords, 4).tolist()))
+        # Haversine距離・一定速度の行列は出発時刻によらないため座標だけをキーにする
+        return _cached_matrices(matrix_key)
+    
+    def _build_common_data(
+        self,
+        request: OptimizationRequest,
+        guests: List[Guest],
+        vehicles: List[Vehicle],
+        coords: np.ndarray,
+        location_names: List[str],
+        distance_matrix: np.ndarray,
+        time_matrix: np.ndarray
+    ) -> Dict:
+        """行列の取得元によらない共通のソルバー入力を組み立てる"""
+        # ゲストの需要（大人＋子供の数）。デポと目的地の需要は0
+        demands_array = np.zeros(len(coords), dtype=np.int32)
+        demands_array[1:-1] = np.fromiter(
+            (guest.num_adults + guest.num_children for guest in guests),
+            dtype=np.int32, count=len(guests)
+        )
         
         # 車両容量
-        vehicle_capacities = []
-        for vehicle in vehicles:
-            vehicle_capacities.append(vehicle.capacity_adults + vehicle.capacity_children)
+        vehicle_capacities_array = np.fromiter(
+            (vehicle.capacity_adults + vehicle.capacity_children for vehicle in vehicles),
+            dtype=np.int32, count=len(vehicles)
+        )
         
-        # 時間窓（シンプルに）
-        time_windows = []
-        for i in range(len(locations)):
-            time_windows.append((0, 600))  # 0-10時間
+        # 時間窓（06:00起点の分、0-10時間）。ゲストは希望時間帯があれば反映
+        time_windows = (
+            [(0, self.TIME_HORIZON_MINUTES)]
+            + [self._guest_time_window_minutes(guest) for guest in guests]
+            + [(0, self.TIME_HORIZON_MINUTES)]
+        )
+        
+        # ソルバー用の整数行列を事前に作成
+        # 距離はメートル単位、時間は出発地点のサービス時間込み（デポ発は除く）
+        service_time = 5
+        distance_matrix_m = np.rint(np.asarray(distance_matrix) * 1000).astype(np.int32)
+        time_matrix_with_service = np.asarray(time_matrix, dtype=np.int32) + service_time
+        time_matrix_with_service[0, :] -= service_time
         
         data = {
             'distance_matrix': distance_matrix,
             'time_matrix': time_matrix,
+            'distance_matrix_m': distance_matrix_m,
+            'time_matrix_with_service': time_matrix_with_service,
+            'coords': coords,
             'location_names': location_names,
             'num_vehicles': len(vehicles),
             'depot': 0,
-            'destination': len(locations) - 1,  # 最後の要素が目的地
-            'demands': demands,
-            'vehicle_capacities': vehicle_capacities,
+            'destination': len(coords) - 1,  # 最後の要素が目的地
+            'demands': demands_array.tolist(),  # OR-Tools用
+            'vehicle_capacities': vehicle_capacities_array.tolist(),
+            'demands_array': demands_array,
+            'vehicle_capacities_array': vehicle_capacities_array,
             'time_windows': time_windows,
-            'service_time': 5,
+            # 出発時刻（06:00起点の分、時間窓と同じ基準）
+            'departure_offset': min(max(
+                self._time_to_minutes(request.departure_time) - self.TIME_ORIGIN_MINUTES, 0
+            ), self.TIME_HORIZON_MINUTES),
+            'service_time': service_time,
             'guest_data': guests,
             'vehicle_data': vehicles
         }
         
         return data
     
+    def _fetch_google_maps_matrices(
+        self,
+        coords: np.ndarray,
+        departure_time: Optional[datetime] = None,
+        max_driving_minutes: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Google Maps距離行列を取得
+        
+        重複地点の除去・100要素ごとのタイル分割と並列取得・キャッシュはサービス側で行う
+        max_driving_minutesで問い合わせを省いた組は大きなペナルティ値で埋める
+        
+        Returns:
+            (距離行列, 時間行列, 全要素をGoogle Mapsから取得できたか)
+        """
+        result = self.google_maps_service.get_distance_matrix_sync(
+            origins=coords,
+            destinations=coords,
+            departure_time=departure_time,
+            max_driving_minutes=max_driving_minutes
+        )
+        distance_matrix = result['distance_matrix'].astype(np.float64)
+        duration_matrix = result['duration_matrix'].astype(np.float64)
+        complete = result['status'] == 'google_maps'
+        self.google_maps_service.release_matrices(result)
+        
+        # 問い合わせなかった組（inf）は最大距離を超える組なので、ソルバーが選ばないよう
+        # 距離・時間ともにペナルティ値で埋める（直線距離で補うと実際の道路より安く見える）
+        pruned = ~np.isfinite(distance_matrix)
+        # 仮想的な出発地点であるデポとの区間は制約の対象外なので直線距離で補う
+        depot_pruned = np.zeros_like(pruned)
+        depot_pruned[0, :] = pruned[0, :]
+        depot_pruned[:, 0] = pruned[:, 0]
+        pruned &= ~depot_pruned
+        if depot_pruned.any():
+            estimate = DistanceCalculator.create_distance_matrix_from_arrays(
+                coords[:, 0], coords[:, 1]
+            )
+            distance_matrix[depot_pruned] = estimate[depot_pruned]
+            duration_matrix[depot_pruned] = estimate[depot_pruned] * 2
+            complete = False  # 制約に依存する行列はキャッシュしない
+        if pruned.any():
+            distance_matrix[pruned] = self.PRUNED_ARC_PENALTY_KM
+            duration_matrix[pruned] = self.TIME_HORIZON_MINUTES
+            complete = False
+        
+        time_matrix = np.rint(duration_matrix).astype(np.int32)
+        return distance_matrix, time_matrix, complete
+    
     def _extract_solution(self, manager, routing, solution, data) -> Dict:
         """OR-Toolsの解から結果を抽出"""
         routes = []
         time_dimension = routing.GetDimensionOrDie('Time')
         capacity_dimension = routing.GetDimensionOrDie('Capacity')
         
-        logger.info(f"Extracting solution for {data['num_vehicles']} vehicles")
+        logger.debug(f"Extracting solution for {data['num_vehicles']} vehicles")
         
         for vehicle_id in range(data['num_vehicles']):
             index = routing.Start(vehicle_id)
@@ -450,7 +982,7 @@ class RouteOptimizer:
                     'time': route_time,
                     'load': route_load
                 })
-                logger.info(f"Vehicle {vehicle_id} has a valid route with {len(route_indices)} stops")
+                logger.debug(f"Vehicle {vehicle_id} has a valid route with {len(route_indices)} stops")
             else:
                 logger.debug(f"Vehicle {vehicle_id} has no valid route (only {len(route_indices)} stops)")
         
@@ -459,7 +991,9 @@ class RouteOptimizer:
         return {
             'routes': routes,
             'total_distance': sum(r['distance'] for r in routes),
-            'total_time': max(r['time'] for r in routes) if routes else 0
+            'total_time': max(r['time'] for r in routes) if routes else 0,
+            # 距離＋時間窓ペナルティ（戦略間の比較に使う）
+            'objective': solution.ObjectiveValue()
         }
     
     def _format_solution(self, data: Dict, solution: Dict, 
@@ -473,21 +1007,36 @@ class RouteOptimizer:
         
         base_time = datetime.combine(request.tour_date, request.departure_time)
         
+        guest_index, _ = build_indexes(guests, vehicles)
+        
         for route_data in solution['routes']:
             vehicle_id = route_data['vehicle_id']
             vehicle = vehicles[vehicle_id]
             
             route_segments = []
             assigned_guests = []
-            vehicle_distance = 0
-            vehicle_time = 0
             
-            route = route_data['route']
+            # 区間ごとの距離・所要時間をまとめて取得
+            route = np.asarray(route_data['route'], dtype=np.intp)
+            from_nodes, to_nodes = route[:-1], route[1:]
+            segment_distances = data['distance_matrix'][from_nodes, to_nodes]
+            segment_durations = data['time_matrix'][from_nodes, to_nodes]
             
-            for i in range(len(route) - 1):
-                from_idx = route[i]
-                to_idx = route[i + 1]
-                
+            # 各地点の出発時刻（出発からの経過分）＝ 移動時間＋サービス時間の累積
+            # ソルバーと同じサービス時間込みの行列を使う（デポ発の区間には含まれない）
+            departure_minutes = np.cumsum(
+                data['time_matrix_with_service'][from_nodes, to_nodes], dtype=np.int32
+            ) + data['service_time']
+            arrival_minutes = departure_minutes - data['service_time']
+            
+            vehicle_distance = float(segment_distances.sum())
+            vehicle_time = int(departure_minutes[-1]) if len(departure_minutes) else 0
+            
+            for from_idx, to_idx, segment_distance, segment_duration, arrival, departure in zip(
+                from_nodes.tolist(), to_nodes.tolist(),
+                segment_distances.tolist(), segment_durations.tolist(),
+                arrival_minutes.tolist(), departure_minutes.tolist()
+            ):
                 # 位置情報を取得
                 from_location = self._get_location_info(from_idx, data, request)
                 to_location = self._get_location_info(to_idx, data, request)
@@ -502,16 +1051,11 @@ class RouteOptimizer:
                         assigned_guests.append(guest_id)
                 
                 # 時刻計算
-                segment_distance = data['distance_matrix'][from_idx][to_idx]
-                segment_duration = data['time_matrix'][from_idx][to_idx]
-                
-                arrival_time = base_time + timedelta(minutes=vehicle_time + segment_duration)
-                departure_time = arrival_time + timedelta(minutes=data['service_time'])
-                
-                vehicle_distance += segment_distance
-                vehicle_time += segment_duration + data['service_time']
+                arrival_time = base_time + timedelta(minutes=arrival)
+                departure_time = base_time + timedelta(minutes=departure)
                 
-                segment = RouteSegment(
+                # 内部で組み立てた値なので検証を省略（APIの応答時に検証される）
+                segment = RouteSegment.model_construct(
                     from_location=from_location,
                     to_location=to_location,
                     guest_id=guest_id,
@@ -524,17 +1068,15 @@ class RouteOptimizer:
                 route_segments.append(segment)
             
             # 車両利用率を計算
-            total_passengers = 0
-            for guest_id in assigned_guests:
-                guest = next((g for g in guests if str(g.id) == guest_id), None)
-                if guest:
-                    total_passengers += guest.num_adults + guest.num_children
+            total_passengers = sum(
+                guest_index[guest_id].total_passengers for guest_id in assigned_guests
+            )
             
-            max_capacity = vehicle.capacity_adults + vehicle.capacity_children
+            max_capacity = data['vehicle_capacities'][vehicle_id]  # 大人＋子供（計算済み）
             vehicle_utilization = total_passengers / max_capacity if max_capacity > 0 else 0
             efficiency_score = min(1.0, vehicle_utilization * 0.8 + 0.2)
             
-            vehicle_route = VehicleRoute(
+            vehicle_route = VehicleRoute.model_construct(
                 vehicle_id=str(vehicle.id),
                 vehicle_name=vehicle.name,
                 route_segments=route_segments,
@@ -574,7 +1116,7 @@ class RouteOptimizer:
     def _get_location_info(self, idx: int, data: Dict, request: OptimizationRequest) -> Location:
         """インデックスから位置情報を取得"""
         if idx == 0:
-            return Location(name="デポ", lat=24.3448, lng=124.1572)
+            return self.DEPOT_LOCATION
         elif idx == data['destination']:
             return request.destination
         else:
@@ -585,6 +1127,49 @@ class RouteOptimizer:
             else:
                 return Location(name="不明", lat=24.3448, lng=124.1572)
     
-    def _time_to_minutes(self, t: time) -> int:
+    def _guest_time_window_minutes(self, guest: Guest) -> Tuple[int, int]:
+        """ゲストの希望時間帯を06:00起点の分に変換（範囲外は丸める）"""
+        window = guest.preferred_time_window
+        if window is None:
+            return (0, self.TIME_HORIZON_MINUTES)
+        
+        # 文字列はTimeWindowのバリデータでtimeに変換済み
+        start_time, end_time = window.start_time, window.end_time
+        start = start_time.hour * 60 + start_time.minute - self.TIME_ORIGIN_MINUTES
+        end = end_time.hour * 60 + end_time.minute - self.TIME_ORIGIN_MINUTES
+        start = min(max(start, 0), self.TIME_HORIZON_MINUTES)
+        end = min(max(end, start), self.TIME_HORIZON_MINUTES)
+        return (start, end)
+    
+    @staticmethod
+    def _time_to_minutes(t: time) -> int:
         """時刻を分単位に変換"""
-        return t.hour * 60 + t.minute
\ No newline at end of file
+        return t.hour * 60 + t.minute
+
+
+_worker_optimizer: Optional[RouteOptimizer] = None
+
+
+def _get_worker_optimizer() -> RouteOptimizer:
+    """ワーカープロセス内で使い回すRouteOptimizerを遅延初期化"""
+    global _worker_optimizer
+    if _worker_optimizer is None:
+        _worker_optimizer = RouteOptimizer()
+    return _worker_optimizer
+
+
+def _solve_cluster(data: Dict, strategy: str,
+                   time_limit_seconds: Optional[int]) -> Optional[Dict]:
+    """クラスタ単位の部分問題を解く（ProcessPoolExecutorのワーカー）"""
+    return _get_worker_optimizer()._solve_vrp(data, strategy, time_limit_seconds)
+
+
+def _solve_with_strategy(data: Dict, strategy: str, time_limit_seconds: Optional[int],
+                         first_solution_strategy: int, metaheuristic: int,
+                         initial_routes: Optional[List[List[int]]] = None) -> Optional[Dict]:
+    """指定した探索戦略で求解（ProcessPoolExecutorのワーカー）"""
+    return _get_worker_optimizer()._solve_vrp(
+        data, strategy, time_limit_seconds, initial_routes,
+        first_solution_strategy=first_solution_strategy,
+        metaheuristic=metaheuristic
+    )
@@ -65,14 +65,8 @@ def main():
     # ルーティングモデルを作成
     routing = pywrapcp.RoutingModel(manager)
     
-    # 距離コールバックを作成・登録
-    def distance_callback(from_index, to_index):
-        """2つのノード間の距離を返す"""
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data['distance_matrix'][from_node][to_node]
-    
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    # 距離行列を登録（Pythonコールバックを介さずC++側で評価される）
+    transit_callback_index = routing.RegisterTransitMatrix(data['distance_matrix'])
     
     # アークコストを定義
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
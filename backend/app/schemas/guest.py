@@ -20,7 +20,7 @@ class GuestBase(BaseModel):
     preferred_pickup_end: Optional[time] = None
     phone: Optional[str] = Field(None, max_length=20)
     email: Optional[EmailStr] = None
-    special_requirements: List[str] = []
+    special_requirements: List[str] = Field(default_factory=list)
 
 
 class GuestCreate(GuestBase):
@@ -28,6 +28,11 @@ class GuestCreate(GuestBase):
     pass
 
 
+class GuestBulkCreate(BaseModel):
+    """ゲスト一括作成用スキーマ"""
+    items: List[GuestCreate] = Field(..., min_length=1, max_length=1000)
+
+
 class GuestUpdate(BaseModel):
     """ゲスト更新用スキーマ（部分更新可能）"""
     name: Optional[str] = Field(None, min_length=1, max_length=100)
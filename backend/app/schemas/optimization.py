@@ -1,8 +1,14 @@
 # backend/app/schemas/optimization.py
-from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Any, Optional, Literal, Union
+from pydantic import BaseModel, BeforeValidator, Field, model_validator
+from typing import Annotated, List, Dict, Any, Optional, Literal, Tuple
 from datetime import date, time, datetime
 from uuid import UUID
+import re
+
+
+# 時刻文字列（H:M[:S]）と datetime.time(...) 表記の解析用
+_TIME_RE = re.compile(r'^(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?$')
+_DT_TIME_RE = re.compile(r'datetime\.time\((\d+),\s*(\d+)(?:,\s*(\d+))?\)')
 
 
 class Location(BaseModel):
@@ -12,47 +18,45 @@ class Location(BaseModel):
     lng: float = Field(..., ge=-180, le=180)
 
 
+def parse_time(v: Any) -> time:
+    """時刻の柔軟な解析（TimeWindowの各時刻フィールドの前処理）"""
+    if isinstance(v, time):
+        return v
+    elif isinstance(v, str):
+        # H:M[:S] 形式のみ受け付ける（タイムゾーン・小数秒付きや区切りなしは不可）
+        match = _TIME_RE.fullmatch(v)
+        if match:
+            hour, minute, second = match.groups()
+            return time(int(hour), int(minute), int(second or 0))
+        raise ValueError(f"Invalid time format: {v}")
+    elif isinstance(v, dict):
+        # 辞書形式の場合
+        if 'datetime.time' in str(v):
+            match = _DT_TIME_RE.search(str(v))
+            if match:
+                hour = int(match.group(1))
+                minute = int(match.group(2))
+                second = int(match.group(3)) if match.group(3) else 0
+                return time(hour, minute, second)
+        raise ValueError(f"Cannot parse time from dict: {v}")
+    else:
+        raise ValueError(f"Invalid time type: {type(v)}")
+
+
+# v1互換の@validatorを経由せず、pydantic-coreのスキーマに直接組み込む
+FlexibleTime = Annotated[time, BeforeValidator(parse_time)]
+
+
 class TimeWindow(BaseModel):
     """時間窓"""
-    start_time: Union[time, str] = Field(alias='start')
-    end_time: Union[time, str] = Field(alias='end')
+    start_time: FlexibleTime = Field(alias='start')
+    end_time: FlexibleTime = Field(alias='end')
     
     class Config:
         populate_by_name = True  # Pydantic v2形式に更新
         json_encoders = {
             time: lambda v: v.strftime("%H:%M:%S") if v else None
         }
-    
-    @validator('start_time', 'end_time', pre=True)
-    def parse_time(cls, v):
-        """時刻の柔軟な解析"""
-        if isinstance(v, time):
-            return v
-        elif isinstance(v, str):
-            # HH:MM:SS 形式
-            try:
-                return datetime.strptime(v, "%H:%M:%S").time()
-            except ValueError:
-                pass
-            # HH:MM 形式
-            try:
-                return datetime.strptime(v, "%H:%M").time()
-            except ValueError:
-                pass
-            raise ValueError(f"Invalid time format: {v}")
-        elif isinstance(v, dict):
-            # 辞書形式の場合
-            if 'datetime.time' in str(v):
-                import re
-                match = re.search(r'datetime\.time\((\d+),\s*(\d+)(?:,\s*(\d+))?\)', str(v))
-                if match:
-                    hour = int(match.group(1))
-                    minute = int(match.group(2))
-                    second = int(match.group(3)) if match.group(3) else 0
-                    return time(hour, minute, second)
-            raise ValueError(f"Cannot parse time from dict: {v}")
-        else:
-            raise ValueError(f"Invalid time type: {type(v)}")
 
 
 class Guest(BaseModel):
@@ -64,7 +68,7 @@ class Guest(BaseModel):
     num_adults: int = Field(..., ge=1)
     num_children: int = Field(0, ge=0)
     preferred_time_window: Optional[TimeWindow] = None
-    special_requirements: List[str] = []
+    special_requirements: List[str] = Field(default_factory=list)
     
     @property
     def total_passengers(self) -> int:
@@ -79,20 +83,26 @@ class Vehicle(BaseModel):
     capacity_children: int = Field(..., ge=0)
     driver_name: Optional[str] = None
     vehicle_type: Literal["sedan", "van", "minibus"] = "van"
-    equipment: List[str] = []
+    equipment: List[str] = Field(default_factory=list)
     
     @property
     def total_capacity(self) -> int:
         return self.capacity_adults + self.capacity_children
 
 
+def build_indexes(guests: List[Guest],
+                  vehicles: List[Vehicle]) -> Tuple[Dict[str, Guest], Dict[str, Vehicle]]:
+    """ゲスト・車両のID → モデルの索引を作成（ループ内の線形探索を避ける）"""
+    return {str(g.id): g for g in guests}, {str(v.id): v for v in vehicles}
+
+
 class OptimizationConstraints(BaseModel):
     """最適化制約条件"""
     max_pickup_time_minutes: int = Field(90, ge=30, le=180)
     buffer_time_minutes: int = Field(15, ge=5, le=30)
     weather_consideration: bool = True
     max_distance_km: Optional[float] = None
-    priority_hotels: List[str] = []
+    priority_hotels: List[str] = Field(default_factory=list)
     priority_time_window: Optional[TimeWindow] = None
     incompatible_pairs: Optional[List[List[str]]] = None
 
@@ -105,10 +115,29 @@ class OptimizationRequest(BaseModel):
     destination: Location
     participant_ids: List[str] = Field(..., min_items=1)
     available_vehicle_ids: List[str] = Field(..., min_items=1)
-    constraints: OptimizationConstraints = OptimizationConstraints()
+    constraints: OptimizationConstraints = Field(default_factory=OptimizationConstraints)
     optimization_strategy: Literal["safety", "efficiency", "balanced"] = "balanced"
     departure_time: time = time(8, 0)
     weather_conditions: Optional[Dict[str, Any]] = None
+    time_limit_seconds: Optional[int] = Field(None, ge=1, le=60)  # 未指定時は設定値
+    # 再最適化用の初期解（車両ごとの訪問ノード番号列。1〜N: 参加者順のゲスト）
+    # 目的地は最適化側で補う。地域分割による求解は行わず、全体を1つの問題として解く
+    initial_routes: Optional[List[List[int]]] = None
+    
+    @model_validator(mode='after')
+    def check_initial_routes(self) -> 'OptimizationRequest':
+        """初期解のノード番号の範囲・重複・ルート数を検証"""
+        if self.initial_routes is None:
+            return self
+        if len(self.initial_routes) > len(self.available_vehicle_ids):
+            raise ValueError("initial_routes must not have more routes than available vehicles")
+        nodes = [node for route in self.initial_routes for node in route]
+        num_guests = len(self.participant_ids)
+        if any(node < 1 or node > num_guests for node in nodes):
+            raise ValueError(f"initial_routes node ids must be between 1 and {num_guests}")
+        if len(set(nodes)) != len(nodes):
+            raise ValueError("initial_routes must not contain duplicate node ids")
+        return self
 
 
 class RouteSegment(BaseModel):
@@ -149,7 +178,7 @@ class OptimizationResult(BaseModel):
     total_time_minutes: int
     average_efficiency_score: float
     optimization_metrics: Dict[str, Any]
-    warnings: List[str] = []
+    warnings: List[str] = Field(default_factory=list)
     computation_time_seconds: float
 
 
@@ -74,8 +74,8 @@ class TourInDB(TourBase):
 
 class TourResponse(TourInDB):
     """APIレスポンス用のツアー情報"""
-    participants: List[TourParticipantInfo] = []
-    optimized_routes: List[OptimizedRouteInfo] = []
+    participants: List[TourParticipantInfo] = Field(default_factory=list)
+    optimized_routes: List[OptimizedRouteInfo] = Field(default_factory=list)
     total_participants: int = 0
     total_vehicles_used: int = 0
 
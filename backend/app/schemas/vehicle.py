@@ -22,7 +22,7 @@ class VehicleBase(BaseModel):
     fuel_type: Optional[str] = Field(None, max_length=20)
     license_plate: Optional[str] = Field(None, max_length=20)
     status: VehicleStatus = VehicleStatus.available
-    equipment: List[str] = []
+    equipment: List[str] = Field(default_factory=list)
 
 
 class VehicleCreate(VehicleBase):
@@ -30,6 +30,11 @@ class VehicleCreate(VehicleBase):
     pass
 
 
+class VehicleBulkCreate(BaseModel):
+    """車両一括作成用スキーマ"""
+    items: List[VehicleCreate] = Field(..., min_length=1, max_length=1000)
+
+
 class VehicleUpdate(BaseModel):
     """車両更新用スキーマ（部分更新可能）"""
     name: Optional[str] = Field(None, min_length=1, max_length=100)
@@ -1,42 +1,451 @@
 # backend/app/services/google_maps_service.py
+import asyncio
 import googlemaps
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Tuple, Dict, Optional
 import numpy as np
 from datetime import datetime
 import logging
-from math import radians, sin, cos, sqrt, atan2
+from math import radians, cos
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # orjsonが無い環境では標準のjsonで解析
+    ORJSON_AVAILABLE = False
+
+from app.optimizer import distance_calculator
+from app.optimizer.distance_calculator import haversine_cross_matrix, haversine_matrix
+from app.services.matrix_cache import get_distance_pair_cache
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=256)
+def decode_polyline_coords(points: str) -> np.ndarray:
+    """
+    エンコード済みポリラインを (N, 2) の緯度・経度配列に変換
+    
+    同じ経路を表示・検証のたびに復号し直さないよう結果を保持する（読み取り専用）
+    """
+    decoded = googlemaps.convert.decode_polyline(points)
+    coords = np.fromiter(
+        (value for point in decoded for value in (point['lat'], point['lng'])),
+        dtype=np.float32, count=2 * len(decoded)
+    ).reshape(-1, 2)
+    coords.flags.writeable = False
+    return coords
+
+
+class OrjsonClient(googlemaps.Client):
+    """APIレスポンスのJSONをorjsonで解析するクライアント（要素数の多い行列向け）"""
+    
+    def _get_body(self, response):
+        if response.status_code != 200:
+            raise googlemaps.exceptions.HTTPError(response.status_code)
+        
+        body = orjson.loads(response.content)
+        
+        api_status = body["status"]
+        if api_status == "OK" or api_status == "ZERO_RESULTS":
+            return body
+        
+        if api_status == "OVER_QUERY_LIMIT":
+            raise googlemaps.exceptions._OverQueryLimit(
+                api_status, body.get("error_message"))
+        
+        raise googlemaps.exceptions.ApiError(api_status, body.get("error_message"))
+
+
 class GoogleMapsService:
+    MAX_CACHE_SIZE = 128  # プロセス内に保持する距離行列の数
+    DEPARTURE_BUCKET_MINUTES = 15  # 出発時刻をこの単位で丸めてキャッシュを共有
+    MAX_ELEMENTS_PER_REQUEST = 100  # Distance Matrix APIの1リクエストあたりの要素数上限
+    MAX_LOCATIONS_PER_REQUEST = 25  # 1リクエストあたりの出発地・目的地それぞれの件数上限
+    TILE_SIZE = 10  # 上限を超える場合の分割単位（10×10=100要素）
+    MAX_CONCURRENT_REQUESTS = 10  # 分割したリクエストの同時実行数
+    MAX_SPEED_KMH = 80.0  # 直線距離から所要時間の下限を見積もるときの最高速度
+    REFERENCE_LAT = 24.34  # 正距円筒近似の基準緯度（石垣島）
+    EQUIRECT_TOLERANCE = 0.01  # 正距円筒近似の誤差の余裕（島内では0.1%未満）
+    # 返す行列の型（km・分。島内の距離ならfloat32で十分、枝刈りしたinfも表せる）
+    MATRIX_DTYPE = np.float32
+    MAX_POOLED_BUFFERS = 4  # 形状・型ごとに再利用のため保持する作業配列の数
+    HTTP_POOL_SIZE = 32  # 保持するHTTPS接続数（並列リクエストごとにTLS接続し直さない）
+    CONNECT_TIMEOUT_SECONDS = 3  # 接続のタイムアウト
+    READ_TIMEOUT_SECONDS = 10  # 読み取りのタイムアウト
+    RETRY_TIMEOUT_SECONDS = 30  # 再試行を含めた1呼び出しの上限時間
+    QUERIES_PER_SECOND = 50  # クライアント側のレート制限
+    
     def __init__(self, api_key: Optional[str] = None):
         """Google Maps クライアントを初期化"""
         from app.core.config import settings
         self.api_key = api_key or settings.GOOGLE_MAPS_API_KEY
         
         if self.api_key and self.api_key != "your-google-maps-api-key":
-            self.client = googlemaps.Client(key=self.api_key)
+            # 複数スレッドから並列に呼ぶため接続プールを大きめに確保
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(
+                pool_connections=self.HTTP_POOL_SIZE, pool_maxsize=self.HTTP_POOL_SIZE
+            ))
+            client_class = OrjsonClient if ORJSON_AVAILABLE else googlemaps.Client
+            self.client = client_class(
+                key=self.api_key,
+                requests_session=session,
+                connect_timeout=self.CONNECT_TIMEOUT_SECONDS,
+                read_timeout=self.READ_TIMEOUT_SECONDS,
+                retry_timeout=self.RETRY_TIMEOUT_SECONDS,
+                queries_per_second=self.QUERIES_PER_SECOND
+            )
             self.enabled = True
             logger.info("Google Maps API enabled")
         else:
             self.client = None
             self.enabled = False
             logger.warning("Google Maps API key not configured, using fallback calculations")
+        
+        # 同じ地点・時間帯の行列を再取得しないためのLRUキャッシュ（スレッド間で共有）
+        self._matrix_cache: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self._matrix_cache_lock = threading.Lock()
+        
+        # 正距円筒近似で使う基準緯度のcos（島内ではほぼ一定）
+        self._cos_lat_ref = cos(radians(self.REFERENCE_LAT))
+        
+        # 同じ大きさの行列を繰り返し確保しないよう、使い終わった配列を形状・型ごとに保持
+        self._buf_pool: Dict[Tuple[Tuple[int, ...], str], List[np.ndarray]] = {}
+        self._buf_pool_lock = threading.Lock()
     
     async def get_distance_matrix(
         self,
         origins: List[Tuple[float, float]],
         destinations: List[Tuple[float, float]],
         departure_time: datetime = None,
-        mode: str = "driving"
+        mode: str = "driving",
+        force_refresh: bool = False,
+        max_driving_minutes: Optional[float] = None
     ) -> Dict[str, np.ndarray]:
         """
         Google Maps Distance Matrix APIを使用して実際の道路距離と時間を取得
+        
+        SDKの呼び出しはブロッキングのためワーカースレッドで実行する
+        """
+        return await asyncio.to_thread(
+            self.get_distance_matrix_sync,
+            origins, destinations, departure_time, mode, force_refresh,
+            max_driving_minutes
+        )
+    
+    def get_distance_matrix_sync(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        departure_time: datetime = None,
+        mode: str = "driving",
+        force_refresh: bool = False,
+        max_driving_minutes: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        get_distance_matrixの同期版（スレッドプールからの並列呼び出し用）
+        
+        APIから全要素を取得できた結果はキャッシュし、force_refresh=Trueで再取得する
+        max_driving_minutesを指定すると、直線距離から見て明らかに超える組は
+        APIに問い合わせずinfとする
         """
         if not self.enabled:
             # フォールバック: Haversine距離を使用
             return self._calculate_haversine_matrix(origins, destinations)
         
+        # 同じホテルのゲストなど重複する地点は1回だけ問い合わせる
+        origins_array = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        destinations_array = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        unique_origins, origin_indices = np.unique(
+            np.round(origins_array, 5), axis=0, return_inverse=True
+        )
+        unique_destinations, destination_indices = np.unique(
+            np.round(destinations_array, 5), axis=0, return_inverse=True
+        )
+        if len(unique_origins) < len(origins_array) or len(unique_destinations) < len(destinations_array):
+            result = self.get_distance_matrix_sync(
+                unique_origins, unique_destinations, departure_time, mode,
+                force_refresh, max_driving_minutes
+            )
+            block = np.ix_(origin_indices.ravel(), destination_indices.ravel())
+            distance_matrix = result['distance_matrix'][block]
+            duration_matrix = result['duration_matrix'][block]
+            self.release_matrices(result)
+            return {
+                'distance_matrix': distance_matrix,
+                'duration_matrix': duration_matrix,
+                'status': result['status'],
+                # 元の並びの各地点が何番目の一意な地点に当たるか
+                'origin_indices': origin_indices.ravel(),
+                'destination_indices': destination_indices.ravel()
+            }
+        
+        if max_driving_minutes is not None:
+            return self._get_pruned_distance_matrix(
+                origins, destinations, departure_time, mode, force_refresh,
+                max_driving_minutes
+            )
+        
+        # 要素数または出発地・目的地の件数の上限を超える場合はタイルに分けて取得
+        # （超過分が欠落しないように）
+        if (len(origins) * len(destinations) > self.MAX_ELEMENTS_PER_REQUEST
+                or len(origins) > self.MAX_LOCATIONS_PER_REQUEST
+                or len(destinations) > self.MAX_LOCATIONS_PER_REQUEST):
+            return self._get_tiled_distance_matrix(
+                origins, destinations, departure_time, mode, force_refresh
+            )
+        
+        cache_key = self._matrix_cache_key(origins, destinations, departure_time, mode)
+        if not force_refresh:
+            cached = self._get_cached_matrix(cache_key)
+            if cached is not None:
+                return cached
+        
+        result = self._request_with_pair_cache(
+            origins, destinations, departure_time, mode, force_refresh
+        )
+        if result['status'] == 'google_maps':
+            self._set_cached_matrix(cache_key, result)
+        return result
+    
+    def _request_with_pair_cache(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        departure_time: Optional[datetime],
+        mode: str,
+        force_refresh: bool
+    ) -> Dict[str, np.ndarray]:
+        """ディスク上のペア単位キャッシュに無い行・列だけAPIに問い合わせる"""
+        departure = departure_time or datetime.now()
+        weekday, hour = departure.weekday(), departure.hour
+        pair_cache = get_distance_pair_cache()
+        
+        distance_matrix, duration_matrix, hit = pair_cache.get_many(
+            origins, destinations, mode, weekday, hour
+        )
+        if force_refresh:
+            hit[:] = False
+        if hit.all():
+            return {
+                'distance_matrix': distance_matrix,
+                'duration_matrix': duration_matrix,
+                'status': 'google_maps'
+            }
+        
+        # 未取得のペアを含む行・列の矩形だけを取得
+        origins_array = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        destinations_array = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        rows = np.flatnonzero(~hit.all(axis=1))
+        cols = np.flatnonzero(~hit.all(axis=0))
+        result = self._request_distance_matrix(
+            origins_array[rows], destinations_array[cols], departure_time, mode
+        )
+        if result['status'] == 'google_maps':
+            pair_cache.set_many(
+                origins_array[rows], destinations_array[cols], mode, weekday, hour,
+                result['distance_matrix'], result['duration_matrix']
+            )
+        
+        block = np.ix_(rows, cols)
+        distance_matrix[block] = result['distance_matrix']
+        duration_matrix[block] = result['duration_matrix']
+        self.release_matrices(result)
+        return {
+            'distance_matrix': distance_matrix,
+            'duration_matrix': duration_matrix,
+            'status': result['status']
+        }
+    
+    def _get_pruned_distance_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        departure_time: Optional[datetime],
+        mode: str,
+        force_refresh: bool,
+        max_driving_minutes: float
+    ) -> Dict[str, np.ndarray]:
+        """直線距離による所要時間の下限で組を絞り込み、残った行・列だけAPIに問い合わせる"""
+        origins_array = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        destinations_array = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        max_distance_km = max_driving_minutes / 60 * self.MAX_SPEED_KMH
+        
+        # 正距円筒近似で大まかに絞り込み、残った組だけHaversine距離で判定する
+        coarse = self._equirect_matrix(
+            origins_array, destinations_array,
+            out=self._alloc((len(origins_array), len(destinations_array)), np.float64)
+        )
+        candidates = coarse <= max_distance_km * (1 + self.EQUIRECT_TOLERANCE)
+        self._release(coarse)
+        i, j = np.nonzero(candidates)
+        o = np.radians(origins_array[i])
+        d = np.radians(destinations_array[j])
+        a = (np.sin((d[:, 0] - o[:, 0]) / 2) ** 2 +
+             np.cos(o[:, 0]) * np.cos(d[:, 0]) * np.sin((d[:, 1] - o[:, 1]) / 2) ** 2)
+        candidates[i, j] = 2 * 6371 * np.arcsin(np.sqrt(a)) <= max_distance_km
+        
+        distance_matrix = self._alloc(candidates.shape)
+        duration_matrix = self._alloc(candidates.shape)
+        distance_matrix.fill(np.inf)
+        duration_matrix.fill(np.inf)
+        rows = np.flatnonzero(candidates.any(axis=1))
+        cols = np.flatnonzero(candidates.any(axis=0))
+        if len(rows) == 0:
+            return {
+                'distance_matrix': distance_matrix,
+                'duration_matrix': duration_matrix,
+                'status': 'google_maps'
+            }
+        
+        result = self.get_distance_matrix_sync(
+            origins_array[rows], destinations_array[cols],
+            departure_time, mode, force_refresh
+        )
+        
+        # 問い合わせた矩形内でも下限を超える組はinfのままにする
+        block = np.ix_(rows, cols)
+        mask = candidates[block]
+        distance_matrix[block] = np.where(mask, result['distance_matrix'], np.inf)
+        duration_matrix[block] = np.where(mask, result['duration_matrix'], np.inf)
+        self.release_matrices(result)
+        logger.debug(
+            f"Pruned distance matrix: {int(candidates.sum())}/{candidates.size} pairs, "
+            f"requested {len(rows)}x{len(cols)}"
+        )
+        
+        return {
+            'distance_matrix': distance_matrix,
+            'duration_matrix': duration_matrix,
+            'status': result['status']
+        }
+    
+    def _get_tiled_distance_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        departure_time: Optional[datetime],
+        mode: str,
+        force_refresh: bool
+    ) -> Dict[str, np.ndarray]:
+        """出発地・目的地を10件ずつのタイルに分け、並列に取得して1つの行列に結合"""
+        tile = self.TILE_SIZE
+        offsets = [
+            (row, col)
+            for row in range(0, len(origins), tile)
+            for col in range(0, len(destinations), tile)
+        ]
+        
+        def fetch(offset):
+            row, col = offset
+            return self.get_distance_matrix_sync(
+                origins[row:row + tile], destinations[col:col + tile],
+                departure_time, mode, force_refresh
+            )
+        
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS) as executor:
+            results = list(executor.map(fetch, offsets))
+        
+        distance_matrix = self._alloc((len(origins), len(destinations)))
+        duration_matrix = self._alloc((len(origins), len(destinations)))
+        for (row, col), result in zip(offsets, results):
+            rows, cols = result['distance_matrix'].shape
+            np.copyto(distance_matrix[row:row + rows, col:col + cols], result['distance_matrix'])
+            np.copyto(duration_matrix[row:row + rows, col:col + cols], result['duration_matrix'])
+            self.release_matrices(result)
+        
+        statuses = {result['status'] for result in results}
+        return {
+            'distance_matrix': distance_matrix,
+            'duration_matrix': duration_matrix,
+            'status': statuses.pop() if len(statuses) == 1 else 'google_maps_partial'
+        }
+    
+    def _matrix_cache_key(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        departure_time: Optional[datetime],
+        mode: str
+    ) -> str:
+        """座標（小数第5位で丸め）・移動手段・出発時間帯からキャッシュキーを作成"""
+        departure = departure_time or datetime.now()
+        bucket = departure.replace(
+            minute=departure.minute - departure.minute % self.DEPARTURE_BUCKET_MINUTES,
+            second=0, microsecond=0
+        )
+        packed = (
+            np.round(np.asarray(origins, dtype=np.float64), 5).tobytes()
+            + b"|"
+            + np.round(np.asarray(destinations, dtype=np.float64), 5).tobytes()
+            + f"|{mode}|{bucket.isoformat()}".encode()
+        )
+        return hashlib.blake2b(packed, digest_size=16).hexdigest()
+    
+    def _get_cached_matrix(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """キャッシュから行列を取得（呼び出し側が書き換えられるようコピーを返す）"""
+        with self._matrix_cache_lock:
+            cached = self._matrix_cache.get(key)
+            if cached is None:
+                return None
+            self._matrix_cache.move_to_end(key)
+        return {
+            'distance_matrix': cached['distance_matrix'].copy(),
+            'duration_matrix': cached['duration_matrix'].copy(),
+            'status': cached['status']
+        }
+    
+    def _set_cached_matrix(self, key: str, result: Dict[str, np.ndarray]) -> None:
+        """行列をキャッシュに保存（上限を超えたら最も古いものから削除）"""
+        entry = {
+            'distance_matrix': result['distance_matrix'].copy(),
+            'duration_matrix': result['duration_matrix'].copy(),
+            'status': result['status']
+        }
+        with self._matrix_cache_lock:
+            self._matrix_cache[key] = entry
+            self._matrix_cache.move_to_end(key)
+            while len(self._matrix_cache) > self.MAX_CACHE_SIZE:
+                self._matrix_cache.popitem(last=False)
+    
+    def _alloc(self, shape: Tuple[int, ...], dtype=None) -> np.ndarray:
+        """プールから作業配列を取り出す（無ければ確保。np.emptyと同様に内容は不定）"""
+        dtype = np.dtype(dtype or self.MATRIX_DTYPE)
+        with self._buf_pool_lock:
+            pooled = self._buf_pool.get((tuple(shape), dtype.str))
+            if pooled:
+                return pooled.pop()
+        return np.empty(shape, dtype=dtype)
+    
+    def _release(self, array: np.ndarray) -> None:
+        """使い終わった配列をプールに戻す（他から参照されない配列だけを渡すこと）"""
+        if not array.flags.c_contiguous or not array.flags.owndata:
+            return
+        with self._buf_pool_lock:
+            pooled = self._buf_pool.setdefault((array.shape, array.dtype.str), [])
+            if len(pooled) < self.MAX_POOLED_BUFFERS:
+                pooled.append(array)
+    
+    def release_matrices(self, result: Dict[str, np.ndarray]) -> None:
+        """get_distance_matrix_syncの結果を使い終わったら行列をプールに戻す"""
+        self._release(result['distance_matrix'])
+        self._release(result['duration_matrix'])
+    
+    def _request_distance_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        departure_time: Optional[datetime],
+        mode: str
+    ) -> Dict[str, np.ndarray]:
+        """Distance Matrix APIを1回呼び出して行列に変換"""
         try:
             # 位置情報を文字列形式に変換
             origin_strs = [f"{lat},{lng}" for lat, lng in origins]
@@ -52,29 +461,37 @@ class GoogleMapsService:
                 units="metric"
             )
             
-            # 結果を行列形式に変換
-            n_origins = len(origins)
-            n_dests = len(destinations)
-            
-            distance_matrix = np.zeros((n_origins, n_dests))
-            duration_matrix = np.zeros((n_origins, n_dests))
+            # 結果を行列形式に変換（要素を1列に並べてからまとめて配列化）
+            shape = (len(origins), len(destinations))
+            elements = [element for row in result['rows'] for element in row['elements']]
+            ok = np.fromiter(
+                (element['status'] == 'OK' for element in elements),
+                dtype=bool, count=len(elements)
+            ).reshape(shape)
+            distance_matrix = np.fromiter(
+                (element['distance']['value'] if element['status'] == 'OK' else 0
+                 for element in elements),
+                dtype=self.MATRIX_DTYPE, count=len(elements)
+            ).reshape(shape) / 1000  # km
+            duration_matrix = np.fromiter(
+                (element['duration']['value'] if element['status'] == 'OK' else 0
+                 for element in elements),
+                dtype=self.MATRIX_DTYPE, count=len(elements)
+            ).reshape(shape) / 60  # 分
             
-            for i, row in enumerate(result['rows']):
-                for j, element in enumerate(row['elements']):
-                    if element['status'] == 'OK':
-                        distance_matrix[i][j] = element['distance']['value'] / 1000  # km
-                        duration_matrix[i][j] = element['duration']['value'] / 60    # 分
-                    else:
-                        # エラーの場合はHaversine距離で代替
-                        distance_matrix[i][j] = self._haversine_distance(
-                            origins[i], destinations[j]
-                        )
-                        duration_matrix[i][j] = distance_matrix[i][j] * 2  # 推定: 30km/h
+            # エラーの要素だけHaversine距離・平均速度30km/hで代替
+            all_ok = bool(ok.all())
+            if not all_ok:
+                fallback = self._calculate_haversine_matrix(origins, destinations)
+                distance_matrix[~ok] = fallback['distance_matrix'][~ok]
+                duration_matrix[~ok] = fallback['duration_matrix'][~ok]
+                self.release_matrices(fallback)
             
             return {
                 'distance_matrix': distance_matrix,
                 'duration_matrix': duration_matrix,
-                'status': 'google_maps'
+                # 一部をHaversineで代替した結果はキャッシュしない
+                'status': 'google_maps' if all_ok else 'google_maps_partial'
             }
             
         except Exception as e:
@@ -100,7 +517,9 @@ class GoogleMapsService:
             if waypoints:
                 waypoint_strs = [f"{lat},{lng}" for lat, lng in waypoints]
             
-            result = self.client.directions(
+            # SDKの呼び出しはブロッキングのためワーカースレッドで実行する
+            result = await asyncio.to_thread(
+                self.client.directions,
                 origin=f"{origin[0]},{origin[1]}",
                 destination=f"{destination[0]},{destination[1]}",
                 waypoints=waypoint_strs,
@@ -129,6 +548,7 @@ class GoogleMapsService:
                     'total_duration': sum(leg['duration'] for leg in legs_info),
                     'legs': legs_info,
                     'polyline': route['overview_polyline']['points'],
+                    'polyline_coords': decode_polyline_coords(route['overview_polyline']['points']),
                     'waypoint_order': route.get('waypoint_order', []),
                     'bounds': route['bounds']
                 }
@@ -138,41 +558,83 @@ class GoogleMapsService:
         
         return None
     
-    def _haversine_distance(self, coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
-        """Haversine公式で距離を計算（フォールバック用）"""
-        R = 6371  # 地球の半径（km）
-        lat1, lon1 = radians(coord1[0]), radians(coord1[1])
-        lat2, lon2 = radians(coord2[0]), radians(coord2[1])
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        
-        return R * c
+    def _equirect_matrix(
+        self,
+        origins: np.ndarray,
+        destinations: np.ndarray,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """正距円筒近似による距離行列（km）。outを渡すとそこへ書き込む"""
+        o = np.radians(origins)
+        d = np.radians(destinations)
+        dlat = d[None, :, 0] - o[:, None, 0]
+        dlon = (d[None, :, 1] - o[:, None, 1]) * self._cos_lat_ref
+        out = np.multiply(dlat, dlat, out=out)
+        out += dlon * dlon
+        np.sqrt(out, out=out)
+        out *= 6371
+        return out
     
     def _calculate_haversine_matrix(
         self, 
         origins: List[Tuple[float, float]], 
         destinations: List[Tuple[float, float]]
     ) -> Dict[str, np.ndarray]:
-        """Haversine距離行列を計算"""
-        n_origins = len(origins)
-        n_dests = len(destinations)
+        """Haversine距離行列を計算（中間配列を作らず出力配列へ直接書き込む）"""
+        o = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+        d = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
         
-        distance_matrix = np.zeros((n_origins, n_dests))
-        duration_matrix = np.zeros((n_origins, n_dests))
+        distance_matrix = self._alloc((len(o), len(d)))
+        duration_matrix = self._alloc((len(o), len(d)))
         
-        for i, origin in enumerate(origins):
-            for j, dest in enumerate(destinations):
-                distance = self._haversine_distance(origin, dest)
-                distance_matrix[i][j] = distance
-                # 石垣島の平均速度30km/hと仮定
-                duration_matrix[i][j] = (distance / 30) * 60  # 分
+        if (distance_calculator.CUDA_AVAILABLE
+                and distance_matrix.size >= distance_calculator.CUDA_MIN_ELEMENTS):
+            # 大規模な行列はGPUでまとめて計算する
+            distance_calculator.haversine_cross_matrix_cuda(
+                np.ascontiguousarray(o[:, 0]), np.ascontiguousarray(o[:, 1]),
+                np.ascontiguousarray(d[:, 0]), np.ascontiguousarray(d[:, 1]),
+                30.0, distance_matrix, duration_matrix
+            )
+            return {
+                'distance_matrix': distance_matrix,
+                'duration_matrix': duration_matrix,
+                'status': 'haversine_fallback'
+            }
+        
+        if o.shape == d.shape and np.array_equal(o, d):
+            # 出発地と目的地が同じ集合なら対称行列なので上三角だけ計算する
+            haversine_matrix(
+                np.ascontiguousarray(o[:, 0]), np.ascontiguousarray(o[:, 1]),
+                distance_matrix
+            )
+            # 石垣島の平均速度30km/hと仮定
+            np.multiply(distance_matrix, 2.0, out=duration_matrix)  # 分
+            return {
+                'distance_matrix': distance_matrix,
+                'duration_matrix': duration_matrix,
+                'status': 'haversine_fallback'
+            }
+        
+        # 石垣島の平均速度30km/hと仮定して所要時間（分）も同時に求める
+        haversine_cross_matrix(
+            np.ascontiguousarray(o[:, 0]), np.ascontiguousarray(o[:, 1]),
+            np.ascontiguousarray(d[:, 0]), np.ascontiguousarray(d[:, 1]),
+            30.0, distance_matrix, duration_matrix
+        )
         
         return {
             'distance_matrix': distance_matrix,
             'duration_matrix': duration_matrix,
             'status': 'haversine_fallback'
-        }
\ No newline at end of file
+        }
+
+
+_google_maps_service: Optional[GoogleMapsService] = None
+
+
+def get_google_maps_service() -> GoogleMapsService:
+    """GoogleMapsServiceを遅延初期化（プロセス内で共有）"""
+    global _google_maps_service
+    if _google_maps_service is None:
+        _google_maps_service = GoogleMapsService()
+    return _google_maps_service
@@ -2,22 +2,91 @@
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta, date
 from collections import Counter, defaultdict
-import pandas as pd
 import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-import json
+from sqlalchemy import and_, func, select
 import logging
 
 from app.models.route_adjustment import RouteAdjustment, AdjustmentType
 from app.models.tour import Tour
 from app.models.guest import Guest
 from app.models.optimized_route import OptimizedRoute
+from app.schemas.optimization import parse_time
+from app.optimizer.distance_calculator import NUMBA_AVAILABLE
+
+if NUMBA_AVAILABLE:
+    from numba import njit
 
 logger = logging.getLogger(__name__)
 
 
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def extract_swap_pairs(orig_flat, orig_offsets, adj_flat, adj_offsets, n_ids):
+        """
+        入れ替えペアを抽出（Numba JIT）
+        
+        各調整の共通区間で位置が変わり、調整後にも残っているゲストと
+        その位置の相手を (小さいID番号, 大きいID番号) の組として出現順に返す
+
+        Args:
+            orig_flat, adj_flat: 全調整のゲスト順（ID番号）を連結した配列
+            orig_offsets, adj_offsets: 各調整の開始位置（長さ 調整数+1）
+            n_ids: ID番号の総数
+        """
+        out = np.empty((orig_flat.shape[0], 2), dtype=np.int64)
+        seen = np.zeros(n_ids, dtype=np.int64)  # 調整ごとの印（毎回クリアしない）
+        count = 0
+        for k in range(orig_offsets.shape[0] - 1):
+            o_start = orig_offsets[k]
+            a_start = adj_offsets[k]
+            a_end = adj_offsets[k + 1]
+            stamp = k + 1
+            for j in range(a_start, a_end):
+                seen[adj_flat[j]] = stamp
+            n = min(orig_offsets[k + 1] - o_start, a_end - a_start)
+            for i in range(n):
+                o = orig_flat[o_start + i]
+                a = adj_flat[a_start + i]
+                if o != a and seen[o] == stamp:
+                    out[count, 0] = min(o, a)
+                    out[count, 1] = max(o, a)
+                    count += 1
+        return out[:count]
+else:
+    def extract_swap_pairs(orig_flat, orig_offsets, adj_flat, adj_offsets, n_ids):
+        """入れ替えペアを抽出（NumPy版、調整ごとにベクトル化）"""
+        pairs = []
+        for k in range(len(orig_offsets) - 1):
+            o = orig_flat[orig_offsets[k]:orig_offsets[k + 1]]
+            adjusted = adj_flat[adj_offsets[k]:adj_offsets[k + 1]]
+            n = min(len(o), len(adjusted))
+            o, a = o[:n], adjusted[:n]
+            mask = (o != a) & np.isin(o, adjusted)
+            pairs.append(np.sort(np.stack([o[mask], a[mask]], axis=1), axis=1))
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        return np.concatenate(pairs)
+
+
 class LearningService:
+    # 分析で使う列（JSON列を含む行全体をORMオブジェクトとして読み込まない）
+    # JSON列は分析に使うキーだけをDB側で取り出し、不要なJSONを転送・デコードしない
+    ANALYSIS_COLUMNS = (
+        RouteAdjustment.id,
+        RouteAdjustment.adjustment_type,
+        RouteAdjustment.original_data['guest_order'].label('original_guest_order'),
+        RouteAdjustment.adjusted_data['guest_order'].label('adjusted_guest_order'),
+        RouteAdjustment.original_data['pickup_times'].label('original_pickup_times'),
+        RouteAdjustment.adjusted_data['pickup_times'].label('adjusted_pickup_times'),
+        RouteAdjustment.affected_guests,
+        RouteAdjustment.adjusted_at,
+        RouteAdjustment.impact_distance_km,
+        RouteAdjustment.impact_time_minutes,
+        RouteAdjustment.reason,
+    )
+    FETCH_BATCH_SIZE = 1000  # 調整データを読み込む単位
+    
     def __init__(self, db: Session):
         self.db = db
     
@@ -25,10 +94,13 @@ class LearningService:
         """過去の調整パターンを分析して学習"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        # 調整データを取得
-        adjustments = self.db.query(RouteAdjustment).filter(
-            RouteAdjustment.adjusted_at >= cutoff_date
-        ).all()
+        # 調整データを必要な列だけ取得（行は属性名でアクセスでき、各分析処理はそのまま使える）
+        stmt = (
+            select(*self.ANALYSIS_COLUMNS)
+            .where(RouteAdjustment.adjusted_at >= cutoff_date)
+            .execution_options(yield_per=self.FETCH_BATCH_SIZE)
+        )
+        adjustments = list(self.db.execute(stmt))
         
         if not adjustments:
             return {
@@ -37,6 +109,9 @@ class LearningService:
                 "recommendations": []
             }
         
+        # 数値・文字列の列は1回だけ取り出して列ごとの配列にしておく
+        columns = self._to_columns(adjustments)
+        
         analysis_result = {
             "period": {
                 "start": cutoff_date.date().isoformat(),
@@ -47,8 +122,8 @@ class LearningService:
                 "frequent_swaps": self._analyze_guest_swaps(adjustments),
                 "time_patterns": self._analyze_time_patterns(adjustments),
                 "hotel_patterns": self._analyze_hotel_patterns(adjustments),
-                "distance_impact": self._analyze_distance_impact(adjustments),
-                "common_reasons": self._analyze_adjustment_reasons(adjustments)
+                "distance_impact": self._analyze_distance_impact(columns),
+                "common_reasons": self._analyze_adjustment_reasons(columns)
             },
             "recommendations": [],
             "learning_rules": []
@@ -64,38 +139,66 @@ class LearningService:
         
         return analysis_result
     
+    def _to_columns(self, adjustments: List[RouteAdjustment]) -> Dict[str, np.ndarray]:
+        """調整データを列ごとの配列に変換（距離・時間の欠損はそれぞれNaN・0）"""
+        n = len(adjustments)
+        return {
+            'adjustment_type': np.array(
+                [adj.adjustment_type.value if adj.adjustment_type else None for adj in adjustments],
+                dtype=object
+            ),
+            'impact_distance_km': np.fromiter(
+                (np.nan if adj.impact_distance_km is None else adj.impact_distance_km
+                 for adj in adjustments),
+                dtype=np.float64, count=n
+            ),
+            'impact_time_minutes': np.fromiter(
+                (adj.impact_time_minutes or 0 for adj in adjustments),
+                dtype=np.float64, count=n
+            ),
+            'reason': np.array([adj.reason for adj in adjustments], dtype=object)
+        }
+    
     def _analyze_guest_swaps(self, adjustments: List[RouteAdjustment]) -> List[Dict]:
         """頻繁に入れ替えられるゲストのペアを分析"""
-        swap_pairs = []
+        orders = [
+            (adj.original_guest_order or [], adj.adjusted_guest_order or [])
+            for adj in adjustments
+            if adj.adjustment_type == AdjustmentType.reorder
+        ]
         
-        for adj in adjustments:
-            if adj.adjustment_type != AdjustmentType.reorder:
-                continue
-                
-            original = adj.original_data.get('guest_order', [])
-            adjusted = adj.adjusted_data.get('guest_order', [])
-            
-            # 入れ替えペアを特定
-            for i in range(len(original)):
-                if i < len(adjusted) and original[i] != adjusted[i]:
-                    # 入れ替え相手を探す
-                    try:
-                        swap_idx = adjusted.index(original[i])
-                        if swap_idx != i:
-                            pair = tuple(sorted([original[i], adjusted[i]]))
-                            swap_pairs.append(pair)
-                    except ValueError:
-                        continue
-        
-        # 頻度分析
-        swap_counts = Counter(swap_pairs)
+        # ゲストIDを整数に置き換える（ソート順で番号付けし、ペア内の順序をIDの順序と一致させる）
+        ids = sorted({guest_id for pair in orders for order in pair for guest_id in order})
+        codes = {guest_id: i for i, guest_id in enumerate(ids)}
+        orig_flat = np.fromiter((codes[g] for original, _ in orders for g in original), dtype=np.int64)
+        adj_flat = np.fromiter((codes[g] for _, adjusted in orders for g in adjusted), dtype=np.int64)
+        orig_offsets = np.cumsum([0] + [len(original) for original, _ in orders], dtype=np.int64)
+        adj_offsets = np.cumsum([0] + [len(adjusted) for _, adjusted in orders], dtype=np.int64)
+        
+        pairs = extract_swap_pairs(orig_flat, orig_offsets, adj_flat, adj_offsets, len(ids))
+        
+        # 頻度分析（回数の降順、同数は初出順 = Counter.most_common と同じ並び）
+        top_pairs = []
+        if len(pairs):
+            unique_pairs, first_seen, counts = np.unique(
+                pairs, axis=0, return_index=True, return_counts=True
+            )
+            for i in np.lexsort((first_seen, -counts))[:10]:
+                top_pairs.append(
+                    ((ids[unique_pairs[i, 0]], ids[unique_pairs[i, 1]]), int(counts[i]))
+                )
+        
+        # 対象ペアのゲスト情報を1回のクエリでまとめて取得
+        guests_by_id = self._get_guests_by_id(
+            guest_id for pair, count in top_pairs if count >= 2 for guest_id in pair
+        )
         
         results = []
-        for (guest1_id, guest2_id), count in swap_counts.most_common(10):
+        for (guest1_id, guest2_id), count in top_pairs:
             if count >= 2:  # 2回以上の入れ替えがあったペア
                 # ゲスト情報を取得
-                guest1 = self.db.query(Guest).filter(Guest.id == guest1_id).first()
-                guest2 = self.db.query(Guest).filter(Guest.id == guest2_id).first()
+                guest1 = guests_by_id.get(str(guest1_id))
+                guest2 = guests_by_id.get(str(guest2_id))
                 
                 if guest1 and guest2:
                     results.append({
@@ -117,80 +220,103 @@ class LearningService:
         
         return results
     
+    def _get_guests_by_id(self, guest_ids) -> Dict[str, Guest]:
+        """ゲストIDの集合を1回のIN句で取得し、ID（文字列）→ ゲストの辞書にする"""
+        ids = {str(guest_id) for guest_id in guest_ids}
+        if not ids:
+            return {}
+        guests = self.db.query(Guest).filter(Guest.id.in_(ids)).all()
+        return {str(guest.id): guest for guest in guests}
+    
+    def _get_hotels_by_guest_id(self, guest_ids) -> Dict[str, str]:
+        """ゲストID（文字列）→ ホテル名の辞書を1回のIN句で取得（必要な2列だけを読む）"""
+        ids = {str(guest_id) for guest_id in guest_ids}
+        if not ids:
+            return {}
+        rows = self.db.query(Guest.id, Guest.hotel_name).filter(Guest.id.in_(ids)).all()
+        return {str(guest_id): hotel_name for guest_id, hotel_name in rows if hotel_name}
+    
     def _analyze_time_patterns(self, adjustments: List[RouteAdjustment]) -> Dict:
         """時間帯別の調整パターンを分析"""
-        time_adjustments = defaultdict(list)
+        changes = []  # (ゲストID, 変更前, 変更後, 曜日)
         
         for adj in adjustments:
-            if 'pickup_times' not in adj.original_data:
+            # 調整されたピックアップ時間を分析（JSONの値は行ごとに1回だけ読む）
+            original_times = adj.original_pickup_times
+            if original_times is None:
                 continue
-            
-            # 調整されたピックアップ時間を分析
-            original_times = adj.original_data.get('pickup_times', {})
-            adjusted_times = adj.adjusted_data.get('pickup_times', {})
+            adjusted_times = adj.adjusted_pickup_times or {}
+            day_of_week = adj.adjusted_at.weekday()
             
             for guest_id, original_time in original_times.items():
                 if guest_id in adjusted_times:
                     adjusted_time = adjusted_times[guest_id]
                     if original_time != adjusted_time:
-                        # 時間変更を記録
-                        guest = self.db.query(Guest).filter(
-                            Guest.id == guest_id
-                        ).first()
-                        if guest:
-                            time_adjustments[guest.hotel_name].append({
-                                'original': original_time,
-                                'adjusted': adjusted_time,
-                                'day_of_week': adj.adjusted_at.weekday()
-                            })
-        
-        # パターンを分析
+                        changes.append((guest_id, original_time, adjusted_time, day_of_week))
+        
+        # 時間が変更されたゲストのホテルを1回のクエリでまとめて取得
+        hotel_by_guest = self._get_hotels_by_guest_id(guest_id for guest_id, _, _, _ in changes)
+        
+        # ホテルごとに件数・遅延・調整後の時間帯・曜日を集計（ホテル・曜日は初出順）
+        stats = {}
+        for guest_id, original_time, adjusted_time, day_of_week in changes:
+            hotel = hotel_by_guest.get(str(guest_id))
+            if not hotel:
+                continue
+            hotel_stats = stats.get(hotel)
+            if hotel_stats is None:
+                hotel_stats = stats[hotel] = {
+                    'total': 0, 'delays': [], 'hours': Counter(), 'days': Counter()
+                }
+            hotel_stats['total'] += 1
+            hotel_stats['days'][day_of_week] += 1
+            
+            # 時刻はここで1回だけ解析しておく（解析できない時刻は時間帯・遅延の集計から除外）
+            original = self._to_datetime(original_time)
+            adjusted = self._to_datetime(adjusted_time)
+            if adjusted is not None:
+                hotel_stats['hours'][adjusted.hour] += 1
+                if original is not None:
+                    hotel_stats['delays'].append((adjusted - original).total_seconds() / 60)
+        
         patterns = {}
-        for hotel, adjustments_list in time_adjustments.items():
-            if len(adjustments_list) >= 3:  # 3回以上の調整があったホテル
-                # DataFrameを作成して分析
-                try:
-                    df = pd.DataFrame(adjustments_list)
-                    
-                    # 最も多い調整後の時間帯
-                    adjusted_hours = pd.to_datetime(df['adjusted']).dt.hour
-                    if not adjusted_hours.empty:
-                        preferred_hour = adjusted_hours.mode().iloc[0] if not adjusted_hours.mode().empty else None
-                    else:
-                        preferred_hour = None
-                    
-                    patterns[hotel] = {
-                        "total_adjustments": len(adjustments_list),
-                        "preferred_pickup_hour": int(preferred_hour) if preferred_hour is not None else None,
-                        "average_delay_minutes": self._calculate_average_delay(df),
-                        "weekday_pattern": self._analyze_weekday_pattern(df)
-                    }
-                except Exception as e:
-                    logger.error(f"Error analyzing time patterns for {hotel}: {e}")
-                    continue
+        for hotel, hotel_stats in stats.items():
+            if hotel_stats['total'] < 3:  # 3回以上の調整があったホテル
+                continue
+            
+            # 最も多い調整後の時間帯（同数なら早い時間）
+            hours = hotel_stats['hours']
+            preferred_hour = min(hours, key=lambda h: (-hours[h], h)) if hours else None
+            # 曜日別の件数（同数なら先に現れた曜日を最多とする）
+            by_day = dict(sorted(hotel_stats['days'].items(), key=lambda kv: kv[1], reverse=True))
+            delays = hotel_stats['delays']
+            patterns[hotel] = {
+                "total_adjustments": hotel_stats['total'],
+                "preferred_pickup_hour": preferred_hour,
+                "average_delay_minutes": int(np.mean(delays)) if delays else 0,
+                "weekday_pattern": {
+                    "most_adjusted_day": next(iter(by_day), None),
+                    "adjustments_by_day": by_day
+                }
+            }
         
         return patterns
     
-    def _calculate_average_delay(self, df: pd.DataFrame) -> int:
-        """平均遅延時間を計算"""
+    @staticmethod
+    def _to_datetime(value) -> Optional[datetime]:
+        """時刻（HH:MM[:SS]）または日時の文字列をdatetimeに変換（解析できなければNone）"""
+        if isinstance(value, datetime):
+            return value
+        if not isinstance(value, str):
+            return None
         try:
-            original_times = pd.to_datetime(df['original'])
-            adjusted_times = pd.to_datetime(df['adjusted'])
-            delays = (adjusted_times - original_times).dt.total_seconds() / 60
-            return int(delays.mean())
-        except:
-            return 0
-    
-    def _analyze_weekday_pattern(self, df: pd.DataFrame) -> Dict:
-        """曜日別のパターンを分析"""
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
         try:
-            weekday_counts = df['day_of_week'].value_counts().to_dict()
-            return {
-                "most_adjusted_day": max(weekday_counts, key=weekday_counts.get) if weekday_counts else None,
-                "adjustments_by_day": weekday_counts
-            }
-        except:
-            return {}
+            return datetime.combine(date.today(), parse_time(value))
+        except ValueError:
+            return None
     
     def _analyze_hotel_patterns(self, adjustments: List[RouteAdjustment]) -> List[Dict]:
         """ホテル別の調整パターン"""
@@ -201,15 +327,18 @@ class LearningService:
             'time_change_count': 0
         })
         
+        # 影響を受けたゲストのホテルを1回のクエリでまとめて取得
+        hotel_by_guest = self._get_hotels_by_guest_id(
+            guest_id for adj in adjustments for guest_id in (adj.affected_guests or [])
+        )
+        
         for adj in adjustments:
-            affected_hotels = set()
-            
             # 影響を受けたゲストのホテルを特定
-            if adj.affected_guests:
-                for guest_id in adj.affected_guests:
-                    guest = self.db.query(Guest).filter(Guest.id == guest_id).first()
-                    if guest and guest.hotel_name:
-                        affected_hotels.add(guest.hotel_name)
+            affected_hotels = {
+                hotel_by_guest[str(guest_id)]
+                for guest_id in (adj.affected_guests or [])
+                if str(guest_id) in hotel_by_guest
+            }
             
             # ホテル別に統計を更新
             for hotel in affected_hotels:
@@ -226,28 +355,28 @@ class LearningService:
         results = []
         for hotel, stats in hotel_stats.items():
             if stats['total_adjustments'] >= 5:  # 5回以上調整があったホテル
+                primary_issue = self._identify_primary_issue(stats)
                 results.append({
                     "hotel_name": hotel,
                     "statistics": stats,
-                    "primary_issue": self._identify_primary_issue(stats),
-                    "recommendation": self._generate_hotel_recommendation(hotel, stats)
+                    "primary_issue": primary_issue,
+                    "recommendation": self._generate_hotel_recommendation(hotel, primary_issue)
                 })
         
-        return sorted(results, key=lambda x: x['statistics']['total_adjustments'], reverse=True)
+        # 学習ルールの生成で全ホテルを使うため上位だけに絞らず全件を並べ替える（コピーせずその場で）
+        results.sort(key=lambda x: x['statistics']['total_adjustments'], reverse=True)
+        return results
     
     def _identify_primary_issue(self, stats: Dict) -> str:
-        """主な問題を特定"""
-        if stats['reorder_count'] > stats['reassign_count'] and stats['reorder_count'] > stats['time_change_count']:
-            return "frequent_reordering"
-        elif stats['reassign_count'] > stats['time_change_count']:
-            return "frequent_reassignment"
-        else:
-            return "frequent_time_changes"
+        """主な問題を特定（件数が同じ場合は時間変更 > 車両変更 > 順序変更の順に優先）"""
+        return max(
+            (stats['reorder_count'], 0, "frequent_reordering"),
+            (stats['reassign_count'], 1, "frequent_reassignment"),
+            (stats['time_change_count'], 2, "frequent_time_changes")
+        )[2]
     
-    def _generate_hotel_recommendation(self, hotel: str, stats: Dict) -> str:
-        """ホテル別の推奨事項を生成"""
-        primary_issue = self._identify_primary_issue(stats)
-        
+    def _generate_hotel_recommendation(self, hotel: str, primary_issue: str) -> str:
+        """ホテル別の推奨事項を生成（primary_issueは_identify_primary_issueの結果）"""
         if primary_issue == "frequent_reordering":
             return f"{hotel}のピックアップ順序を見直すことを推奨"
         elif primary_issue == "frequent_reassignment":
@@ -255,47 +384,51 @@ class LearningService:
         else:
             return f"{hotel}のピックアップ時間枠を調整することを推奨"
     
-    def _analyze_distance_impact(self, adjustments: List[RouteAdjustment]) -> Dict:
-        """調整による距離への影響を分析"""
-        impacts = []
-        
-        for adj in adjustments:
-            if adj.impact_distance_km is not None:
-                impacts.append({
-                    'type': adj.adjustment_type.value,
-                    'distance_change': adj.impact_distance_km,
-                    'time_change': adj.impact_time_minutes or 0
-                })
-        
-        if not impacts:
+    def _analyze_distance_impact(self, columns: Dict[str, np.ndarray]) -> Dict:
+        """調整による距離への影響を分析（距離の影響が記録された調整のみ）"""
+        has_impact = ~np.isnan(columns['impact_distance_km'])
+        if not has_impact.any():
             return {}
         
-        df = pd.DataFrame(impacts)
+        distances = columns['impact_distance_km'][has_impact]
+        times = columns['impact_time_minutes'][has_impact]
+        
+        # 種類ごとの平均（種類はソート順、欠損は除外）
+        # 距離・時間・件数の合計を1回の集計でまとめて求め、最後に割る
+        type_values = columns['adjustment_type'][has_impact]
+        types = sorted({t for t in type_values if t is not None})
+        type_index = {t: i for i, t in enumerate(types)}
+        codes = np.fromiter((type_index.get(t, -1) for t in type_values), dtype=np.int64, count=len(type_values))
+        valid = codes >= 0
+        totals = np.zeros((len(types), 3))  # 列: 距離の合計, 時間の合計, 件数
+        np.add.at(totals, codes[valid],
+                  np.column_stack((distances[valid], times[valid], np.ones(valid.sum()))))
+        distance_means, time_means = (totals[:, :2] / np.maximum(totals[:, 2:], 1)).T
         
         return {
-            'average_distance_increase': float(df['distance_change'].mean()),
-            'average_time_increase': float(df['time_change'].mean()),
-            'by_type': df.groupby('type').agg({
-                'distance_change': 'mean',
-                'time_change': 'mean'
-            }).to_dict()
+            'average_distance_increase': float(distances.mean()),
+            'average_time_increase': float(times.mean()),
+            'by_type': {
+                'distance_change': dict(zip(types, distance_means.tolist())),
+                'time_change': dict(zip(types, time_means.tolist()))
+            }
         }
     
-    def _analyze_adjustment_reasons(self, adjustments: List[RouteAdjustment]) -> List[Dict]:
+    def _analyze_adjustment_reasons(self, columns: Dict[str, np.ndarray]) -> List[Dict]:
         """調整理由の分析"""
-        reasons = []
-        
-        for adj in adjustments:
-            if adj.reason:
-                reasons.append(adj.reason.lower())
+        reason_counts = Counter()
+        total_reasons = 0  # 理由が記録された調整の数（割合の分母）
         
-        reason_counts = Counter(reasons)
+        for reason in columns['reason']:
+            if reason:
+                reason_counts[reason.lower()] += 1
+                total_reasons += 1
         
         return [
             {
                 "reason": reason,
                 "count": count,
-                "percentage": count / len(reasons) * 100 if reasons else 0
+                "percentage": count / total_reasons * 100 if total_reasons else 0
             }
             for reason, count in reason_counts.most_common(10)
         ]
@@ -0,0 +1,242 @@
+# backend/app/services/matrix_cache.py
+"""
+距離行列の永続キャッシュ
+Google Mapsから取得した距離・時間行列をSQLiteに保存し、再起動後も再利用する
+"""
+
+import hashlib
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DistanceMatrixCache:
+    """SQLiteベースの距離行列キャッシュ"""
+    
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS distance_matrices (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    distance BLOB NOT NULL,
+                    duration BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        # スレッド間で共有しないよう、操作ごとに接続する（withでは閉じないためclosingで包む）
+        return sqlite3.connect(self.path, timeout=5)
+    
+    @staticmethod
+    def make_key(coords: np.ndarray, weekday: int, departure_hour: str) -> str:
+        """座標（小数第6位で丸め、並び順どおり）と出発の曜日・時間帯からキーを作成"""
+        packed = np.round(coords, 6).astype('>f8').tobytes()
+        suffix = f"{weekday}:{departure_hour}".encode()
+        return hashlib.blake2b(packed + suffix, digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """キャッシュから (距離行列, 時間行列) を取得。無いか期限切れならNone"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT size, distance, duration FROM distance_matrices "
+                    "WHERE key = ? AND created_at > ?",
+                    (key, time.time() - self.ttl_seconds)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Distance matrix cache read failed: {e}")
+            return None
+        
+        if row is None:
+            return None
+        size, distance, duration = row
+        return (
+            np.frombuffer(distance, dtype=np.float64).reshape(size, size),
+            np.frombuffer(duration, dtype=np.int32).reshape(size, size)
+        )
+    
+    def set(self, key: str, distance_matrix: np.ndarray, time_matrix: np.ndarray) -> None:
+        """距離行列・時間行列を保存（期限切れの行は同時に削除）"""
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "DELETE FROM distance_matrices WHERE created_at <= ?",
+                    (now - self.ttl_seconds,)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO distance_matrices VALUES (?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        len(distance_matrix),
+                        np.ascontiguousarray(distance_matrix, dtype=np.float64).tobytes(),
+                        np.ascontiguousarray(time_matrix, dtype=np.int32).tobytes(),
+                        now
+                    )
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Distance matrix cache write failed: {e}")
+
+
+class DistancePairCache:
+    """
+    SQLiteベースの地点ペア単位の距離・所要時間キャッシュ
+    
+    ゲストの組み合わせは日ごとに変わっても、ホテル→港などの個々の区間は
+    繰り返し現れるため、行列全体ではなく (出発地, 目的地, 曜日, 時) ごとに保存する
+    """
+    
+    COORD_SCALE = 100000  # 座標を小数第5位（約1m）の整数にしてキーにする
+    
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS distance_pairs (
+                    origin_lat INTEGER NOT NULL,
+                    origin_lng INTEGER NOT NULL,
+                    dest_lat INTEGER NOT NULL,
+                    dest_lng INTEGER NOT NULL,
+                    mode TEXT NOT NULL,
+                    weekday INTEGER NOT NULL,
+                    hour INTEGER NOT NULL,
+                    distance REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (origin_lat, origin_lng, dest_lat, dest_lng, mode, weekday, hour)
+                )
+                """
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        # スレッド間で共有しないよう、操作ごとに接続する（withでは閉じないためclosingで包む）
+        return sqlite3.connect(self.path, timeout=5)
+    
+    def _scaled(self, coords) -> np.ndarray:
+        return np.rint(
+            np.asarray(coords, dtype=np.float64).reshape(-1, 2) * self.COORD_SCALE
+        ).astype(np.int64)
+    
+    def get_many(
+        self,
+        origins,
+        destinations,
+        mode: str,
+        weekday: int,
+        hour: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        全ペアをまとめて検索
+        
+        Returns:
+            (距離行列km, 所要時間行列分, キャッシュにあったかのマスク)
+        """
+        o = self._scaled(origins)
+        d = self._scaled(destinations)
+        shape = (len(o), len(d))
+        distance = np.zeros(shape, dtype=np.float32)
+        duration = np.zeros(shape, dtype=np.float32)
+        hit = np.zeros(shape, dtype=bool)
+        if not o.size or not d.size:
+            return distance, duration, hit
+        
+        # 問い合わせるペアをVALUES句で渡し、1回のJOINで取得する
+        pairs = [
+            (i, j, *o[i].tolist(), *d[j].tolist())
+            for i in range(shape[0]) for j in range(shape[1])
+        ]
+        values = ",".join(["(?, ?, ?, ?, ?, ?)"] * len(pairs))
+        params = [value for pair in pairs for value in pair]
+        try:
+            with closing(self._connect()) as conn, conn:
+                rows = conn.execute(
+                    f"WITH q(i, j, olat, olng, dlat, dlng) AS (VALUES {values}) "
+                    "SELECT q.i, q.j, p.distance, p.duration FROM q JOIN distance_pairs p "
+                    "ON p.origin_lat = q.olat AND p.origin_lng = q.olng "
+                    "AND p.dest_lat = q.dlat AND p.dest_lng = q.dlng "
+                    "AND p.mode = ? AND p.weekday = ? AND p.hour = ? AND p.created_at > ?",
+                    params + [mode, weekday, hour, time.time() - self.ttl_seconds]
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Distance pair cache read failed: {e}")
+            return distance, duration, hit
+        
+        for i, j, pair_distance, pair_duration in rows:
+            distance[i, j] = pair_distance
+            duration[i, j] = pair_duration
+            hit[i, j] = True
+        return distance, duration, hit
+    
+    def set_many(
+        self,
+        origins,
+        destinations,
+        mode: str,
+        weekday: int,
+        hour: int,
+        distance_matrix: np.ndarray,
+        duration_matrix: np.ndarray
+    ) -> None:
+        """行列の全ペアを保存（期限切れの行は同時に削除）"""
+        o = self._scaled(origins)
+        d = self._scaled(destinations)
+        now = time.time()
+        rows = [
+            (*o[i].tolist(), *d[j].tolist(), mode, weekday, hour,
+             float(distance_matrix[i, j]), float(duration_matrix[i, j]), now)
+            for i in range(len(o)) for j in range(len(d))
+        ]
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "DELETE FROM distance_pairs WHERE created_at <= ?",
+                    (now - self.ttl_seconds,)
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO distance_pairs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Distance pair cache write failed: {e}")
+
+
+_distance_matrix_cache: Optional[DistanceMatrixCache] = None
+_distance_pair_cache: Optional[DistancePairCache] = None
+
+
+def get_distance_matrix_cache() -> DistanceMatrixCache:
+    """DistanceMatrixCacheを遅延初期化（プロセス内で共有）"""
+    global _distance_matrix_cache
+    if _distance_matrix_cache is None:
+        _distance_matrix_cache = DistanceMatrixCache(
+            settings.DISTANCE_MATRIX_CACHE_PATH,
+            settings.DISTANCE_MATRIX_CACHE_TTL_DAYS * 86400
+        )
+    return _distance_matrix_cache
+
+
+def get_distance_pair_cache() -> DistancePairCache:
+    """DistancePairCacheを遅延初期化（プロセス内で共有）"""
+    global _distance_pair_cache
+    if _distance_pair_cache is None:
+        _distance_pair_cache = DistancePairCache(
+            settings.DISTANCE_MATRIX_CACHE_PATH,
+            settings.DISTANCE_MATRIX_CACHE_TTL_DAYS * 86400
+        )
+    return _distance_pair_cache
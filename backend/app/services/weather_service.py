@@ -3,23 +3,82 @@
 Open-Meteo APIを使用して石垣島の気象情報を取得
 """
 
+import asyncio
 import httpx
+import copy
+import time
 from datetime import date, datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import logging
+import numpy as np
 
 from app.core.config import settings
 
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # h2が無い環境ではHTTP/1.1のkeep-aliveのみ
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# 安全性スコアの減点表（しきい値を「超えた」数で係数を引く）
+WIND_THRESHOLDS = np.array([10.0, 15.0, 20.0])  # 最大風速
+WIND_FACTORS = np.array([1.0, 0.8, 0.6, 0.3])
+PRECIPITATION_THRESHOLDS = np.array([0.0, 5.0, 10.0])  # 日降水量
+PRECIPITATION_FACTORS = np.array([1.0, 0.9, 0.7, 0.5])
+WAVE_THRESHOLDS = np.array([1.0, 1.5, 2.0])  # 波高（海のアクティビティのみ）
+WAVE_FACTORS = np.array([1.0, 0.8, 0.6, 0.3])
+MARINE_ACTIVITIES = ("snorkeling", "diving", "kayaking")
+
 
 class WeatherService:
     """気象データ取得サービス"""
     
+    REQUEST_TIMEOUT_SECONDS = 10.0
+    MAX_KEEPALIVE_CONNECTIONS = 10
+    CACHE_TTL_SECONDS = 3600  # 同じ日の予報・海況を再取得しない期間
+    
     def __init__(self):
         self.base_url = settings.WEATHER_API_BASE_URL
         self.ishigaki_lat = 24.3448
         self.ishigaki_lon = 124.1572
+        self._client: Optional[httpx.AsyncClient] = None  # 遅延初期化
+        # (エンドポイント, 対象日) → (取得時刻, 解析済みデータ)
+        self._cache: Dict[Tuple[str, date], Tuple[float, Dict]] = {}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """接続を使い回すHTTPクライアント（呼び出しごとにTLS接続し直さない）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.REQUEST_TIMEOUT_SECONDS,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_keepalive_connections=self.MAX_KEEPALIVE_CONNECTIONS)
+            )
+        return self._client
+    
+    def _get_cached(self, endpoint: str, target_date: date) -> Optional[Dict]:
+        """有効期限内のキャッシュを取得（呼び出し側が書き換えてもよいようコピーを返す）"""
+        entry = self._cache.get((endpoint, target_date))
+        if entry is None:
+            return None
+        fetched_at, data = entry
+        if time.monotonic() - fetched_at >= self.CACHE_TTL_SECONDS:
+            del self._cache[(endpoint, target_date)]
+            return None
+        return copy.deepcopy(data)
+    
+    def _set_cached(self, endpoint: str, target_date: date, data: Dict) -> None:
+        """APIから取得できたデータだけをキャッシュ（デフォルト値は保存しない）"""
+        if not data.get("default"):
+            self._cache[(endpoint, target_date)] = (time.monotonic(), copy.deepcopy(data))
+    
+    async def aclose(self) -> None:
+        """HTTPクライアントを閉じる（終了時に呼ぶ）"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
         
     async def get_weather_forecast(self, target_date: date) -> Dict:
         """
@@ -31,27 +90,29 @@ class WeatherService:
         Returns:
             気象データ辞書
         """
+        cached = self._get_cached("forecast", target_date)
+        if cached is not None:
+            return cached
+        
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "latitude": self.ishigaki_lat,
-                    "longitude": self.ishigaki_lon,
-                    "hourly": "temperature_2m,precipitation,windspeed_10m,winddirection_10m",
-                    "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
-                    "timezone": "Asia/Tokyo",
-                    "start_date": target_date.isoformat(),
-                    "end_date": target_date.isoformat()
-                }
-                
-                response = await client.get(
-                    f"{self.base_url}/forecast",
-                    params=params
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                return self._parse_weather_data(data, target_date)
-                
+            params = {
+                "latitude": self.ishigaki_lat,
+                "longitude": self.ishigaki_lon,
+                "hourly": "temperature_2m,precipitation,windspeed_10m,winddirection_10m",
+                "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
+                "timezone": "Asia/Tokyo",
+                "start_date": target_date.isoformat(),
+                "end_date": target_date.isoformat()
+            }
+            
+            response = await self._get_client().get("/forecast", params=params)
+            response.raise_for_status()
+            
+            data = response.json()
+            weather = self._parse_weather_data(data, target_date)
+            self._set_cached("forecast", target_date, weather)
+            return weather
+            
         except httpx.HTTPError as e:
             logger.error(f"Weather API error: {e}")
             return self._get_default_weather()
@@ -69,34 +130,61 @@ class WeatherService:
         Returns:
             海況データ辞書
         """
+        marine = await self._fetch_marine(target_date)
+        if marine is not None:
+            return marine
+        
+        # マリンデータが利用できない場合は風速から推定
+        weather = await self.get_weather_forecast(target_date)
+        return self._estimate_marine_conditions(weather)
+    
+    async def get_day_conditions(self, target_date: date) -> Dict:
+        """
+        天気予報と海況を同時に取得（2つのリクエストの待ち時間を重ねる）
+        
+        Args:
+            target_date: 対象日
+            
+        Returns:
+            {"weather": 気象データ辞書, "marine": 海況データ辞書}
+        """
+        weather, marine = await asyncio.gather(
+            self.get_weather_forecast(target_date),
+            self._fetch_marine(target_date)
+        )
+        if marine is None:
+            # 天気予報は取得済みなので追加のリクエスト無しで推定できる
+            marine = self._estimate_marine_conditions(weather)
+        return {"weather": weather, "marine": marine}
+    
+    async def _fetch_marine(self, target_date: date) -> Optional[Dict]:
+        """Marine APIから海況を取得（利用できなければNone）"""
+        cached = self._get_cached("marine", target_date)
+        if cached is not None:
+            return cached
+        
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "latitude": self.ishigaki_lat,
-                    "longitude": self.ishigaki_lon,
-                    "hourly": "wave_height,wave_direction,wave_period",
-                    "timezone": "Asia/Tokyo",
-                    "start_date": target_date.isoformat(),
-                    "end_date": target_date.isoformat()
-                }
-                
-                response = await client.get(
-                    f"{self.base_url}/marine",
-                    params=params
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return self._parse_marine_data(data, target_date)
-                else:
-                    # マリンデータが利用できない場合は風速から推定
-                    weather = await self.get_weather_forecast(target_date)
-                    return self._estimate_marine_conditions(weather)
-                    
+            params = {
+                "latitude": self.ishigaki_lat,
+                "longitude": self.ishigaki_lon,
+                "hourly": "wave_height,wave_direction,wave_period",
+                "timezone": "Asia/Tokyo",
+                "start_date": target_date.isoformat(),
+                "end_date": target_date.isoformat()
+            }
+            
+            response = await self._get_client().get("/marine", params=params)
+            if response.status_code != 200:
+                return None
+            
+            data = response.json()
+            marine = self._parse_marine_data(data, target_date)
+            self._set_cached("marine", target_date, marine)
+            return marine
+            
         except Exception as e:
             logger.warning(f"Marine data not available: {e}")
-            weather = await self.get_weather_forecast(target_date)
-            return self._estimate_marine_conditions(weather)
+            return None
     
     def _parse_weather_data(self, data: Dict, target_date: date) -> Dict:
         """気象データをパース"""
@@ -208,34 +296,33 @@ class WeatherService:
         Returns:
             安全性スコア
         """
-        score = 1.0
-        
-        # 共通の減点要素
         wind_speed = weather.get("wind", {}).get("max_speed", 0)
         precipitation = weather.get("precipitation", {}).get("daily_sum", 0)
+        wave_height = marine.get("wave_height", 0)
         
-        if wind_speed > 20:
-            score *= 0.3
-        elif wind_speed > 15:
-            score *= 0.6
-        elif wind_speed > 10:
-            score *= 0.8
-            
-        if precipitation > 10:
-            score *= 0.5
-        elif precipitation > 5:
-            score *= 0.7
-        elif precipitation > 0:
-            score *= 0.9
-        
-        # アクティビティ別の考慮
-        if activity_type in ["snorkeling", "diving", "kayaking"]:
-            wave_height = marine.get("wave_height", 0)
-            if wave_height > 2:
-                score *= 0.3
-            elif wave_height > 1.5:
-                score *= 0.6
-            elif wave_height > 1:
-                score *= 0.8
+        score = float(self.get_safety_scores(
+            wind_speed, precipitation, wave_height, activity_type in MARINE_ACTIVITIES
+        ))
+        return round(score, 2)
+    
+    @staticmethod
+    def get_safety_scores(wind_speed, precipitation, wave_height, is_marine) -> np.ndarray:
+        """
+        安全性スコアを配列でまとめて計算（丸めなし）
         
-        return round(score, 2)  
\ No newline at end of file
+        Args:
+            wind_speed: 最大風速
+            precipitation: 日降水量
+            wave_height: 波高
+            is_marine: 海のアクティビティか（Trueのとき波高で減点）
+            
+        Returns:
+            安全性スコアの配列（入力をブロードキャストした形状）
+        """
+        # しきい値を超えた数（side='left'で「超える」判定になる）を減点表の添字にする
+        score = (
+            WIND_FACTORS[np.searchsorted(WIND_THRESHOLDS, wind_speed, side='left')]
+            * PRECIPITATION_FACTORS[np.searchsorted(PRECIPITATION_THRESHOLDS, precipitation, side='left')]
+        )
+        wave_factor = WAVE_FACTORS[np.searchsorted(WAVE_THRESHOLDS, wave_height, side='left')]
+        return score * np.where(is_marine, wave_factor, 1.0)  
\ No newline at end of file
@@ -2,39 +2,42 @@
 データベースのテーブル構造を確認
 """
 
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, MetaData
 from app.core.config import settings
 
 def check_database_structure():
     """データベースの構造を確認"""
     engine = create_engine(settings.DATABASE_URL)
-    inspector = inspect(engine)
+    
+    # 全テーブルのカラム・インデックス・外部キーを1回のリフレクションでまとめて取得
+    metadata = MetaData()
+    metadata.reflect(bind=engine)
     
     # テーブル一覧
-    tables = inspector.get_table_names()
     print("=== データベーステーブル一覧 ===")
-    for table in tables:
-        print(f"\n📋 テーブル: {table}")
+    for name in sorted(metadata.tables):
+        table = metadata.tables[name]
+        print(f"\n📋 テーブル: {name}")
         
         # カラム情報
-        columns = inspector.get_columns(table)
         print("  カラム:")
-        for col in columns:
-            print(f"    - {col['name']}: {col['type']} {'(NOT NULL)' if not col['nullable'] else ''}")
+        for col in table.columns:
+            print(f"    - {col.name}: {col.type} {'(NOT NULL)' if not col.nullable else ''}")
         
         # インデックス
-        indexes = inspector.get_indexes(table)
+        indexes = sorted(table.indexes, key=lambda idx: idx.name or "")
         if indexes:
             print("  インデックス:")
             for idx in indexes:
-                print(f"    - {idx['name']}: {idx['column_names']}")
+                print(f"    - {idx.name}: {[col.name for col in idx.columns]}")
         
         # 外部キー
-        foreign_keys = inspector.get_foreign_keys(table)
+        foreign_keys = table.foreign_key_constraints
         if foreign_keys:
             print("  外部キー:")
             for fk in foreign_keys:
-                print(f"    - {fk['name']}: {fk['constrained_columns']} -> {fk['referred_table']}.{fk['referred_columns']}")
+                referred_columns = [element.column.name for element in fk.elements]
+                print(f"    - {fk.name}: {fk.column_keys} -> {fk.referred_table.name}.{referred_columns}")
 
 if __name__ == "__main__":
-    check_database_structure()
\ No newline at end of file
+    check_database_structure()
@@ -65,19 +65,7 @@ print("=== シンプルなケースでのデバッグ ===")
 optimizer = RouteOptimizer()
 
 # データ準備を確認
-# _prepare_data_asyncを使用するように修正
-import asyncio
-
-async def get_data():
-    return await optimizer._prepare_data_with_google_maps(request, guests, vehicles)
-
-# 同期的に実行
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-try:
-    data = loop.run_until_complete(get_data())
-finally:
-    loop.close()
+data = optimizer._prepare_data_with_google_maps(request, guests, vehicles)
 print("\n距離行列:")
 for i, row in enumerate(data['distance_matrix']):
     print(f"{data['location_names'][i]:20} {row}")
@@ -1,10 +1,6 @@
-import requests
-import json
 from datetime import datetime, date
-import time
 
-# ベースURL
-base_url = "http://localhost:8000/api/v1"
+from api_client import base_url, session, wait_for_job
 
 print("=== 石垣島ツアー最適化 - DB統合テスト ===\n")
 
@@ -21,7 +17,7 @@ tour_data = {
     "optimization_strategy": "balanced"
 }
 
-response = requests.post(f"{base_url}/tours/", json=tour_data)
+response = session.post(f"{base_url}/tours/", json=tour_data)
 if response.status_code == 200:
     tour = response.json()
     tour_id = tour["id"]
@@ -40,7 +36,7 @@ guest_ids = [
 ]
 
 for guest_id in guest_ids:
-    response = requests.post(f"{base_url}/tours/{tour_id}/participants/{guest_id}")
+    response = session.post(f"{base_url}/tours/{tour_id}/participants/{guest_id}")
     if response.status_code == 200:
         print(f"✅ ゲスト {guest_id} を追加")
     else:
@@ -48,7 +44,7 @@ for guest_id in guest_ids:
 
 # 3. ツアー情報を確認
 print("\n3. ツアー情報を確認中...")
-response = requests.get(f"{base_url}/tours/{tour_id}")
+response = session.get(f"{base_url}/tours/{tour_id}")
 if response.status_code == 200:
     tour_info = response.json()
     print(f"✅ ツアー日付: {tour_info['tour_date']}")
@@ -58,7 +54,7 @@ if response.status_code == 200:
 
 # 4. ツアーの最適化を実行
 print(f"\n4. ツアー {tour_id} の最適化を実行中...")
-response = requests.post(f"{base_url}/tours/{tour_id}/optimize")
+response = session.post(f"{base_url}/tours/{tour_id}/optimize")
 if response.status_code == 200:
     result = response.json()
     job_id = result["job_id"]
@@ -66,24 +62,19 @@ if response.status_code == 200:
     
     # 5. 最適化の完了を待つ
     print("\n5. 最適化の完了を待っています...")
-    max_attempts = 10
-    for i in range(max_attempts):
-        time.sleep(2)
-        response = requests.get(f"{base_url}/optimize/status/{job_id}")
-        if response.status_code == 200:
-            status = response.json()
-            print(f"   状態: {status['status']} (進捗: {status['progress_percentage']}%)")
-            
-            if status['status'] == 'completed':
-                print("✅ 最適化完了！")
-                break
-            elif status['status'] == 'failed':
-                print(f"❌ 最適化失敗: {status.get('error_message', 'Unknown error')}")
-                exit(1)
+    status = wait_for_job(job_id)
+    if status:
+        print(f"   状態: {status['status']} (進捗: {status['progress_percentage']}%)")
+        
+        if status['status'] == 'completed':
+            print("✅ 最適化完了！")
+        elif status['status'] == 'failed':
+            print(f"❌ 最適化失敗: {status.get('error_message', 'Unknown error')}")
+            exit(1)
     
     # 6. 最適化結果を取得
     print("\n6. 最適化結果を取得中...")
-    response = requests.get(f"{base_url}/optimize/result/{job_id}")
+    response = session.get(f"{base_url}/optimize/result/{job_id}")
     if response.status_code == 200:
         optimization_result = response.json()
         print("✅ 最適化結果:")
@@ -94,7 +85,7 @@ if response.status_code == 200:
     
     # 7. DBに保存された結果を確認
     print("\n7. DBに保存された最適化結果を確認中...")
-    response = requests.get(f"{base_url}/tours/{tour_id}/optimization-result")
+    response = session.get(f"{base_url}/tours/{tour_id}/optimization-result")
     if response.status_code == 200:
         saved_result = response.json()
         print("✅ DB保存確認:")
@@ -120,7 +111,7 @@ else:
 
 # 8. クリーンアップ
 print("\n8. クリーンアップ中...")
-response = requests.delete(f"{base_url}/tours/{tour_id}")
+response = session.delete(f"{base_url}/tours/{tour_id}")
 if response.status_code == 200:
     print("✅ ツアー削除完了")
 else:
@@ -5,12 +5,21 @@
 - 車両容量ギリギリ
 """
 
-import requests
-import json
-from datetime import datetime, time
-import time as time_module
+import asyncio
+import sys
+import numpy as np
+
+from api_client import base_url, session, wait_for_job, request_all, save_json
+
+# このケースは容量超過時の挙動を確認するため、既定では警告のみで最適化まで実行する
+ABORT_IF_OVER_CAPACITY = False
+
+
+def parse_hms(s):
+    """HH:MM:SS を0時からの秒数に変換"""
+    h, m, sec = s.split(':')
+    return int(h) * 3600 + int(m) * 60 + int(sec)
 
-base_url = "http://localhost:8000/api/v1"
 
 print("=== 複雑なテストケース2: 厳しい時間制約 ===\n")
 
@@ -34,15 +43,6 @@ vehicles_data = [
     }
 ]
 
-print("車両を登録中...")
-vehicle_ids = []
-for v_data in vehicles_data:
-    response = requests.post(f"{base_url}/vehicles/", json=v_data)
-    if response.status_code == 200:
-        vehicle = response.json()
-        vehicle_ids.append(vehicle["id"])
-        print(f"✅ {v_data['name']}登録成功")
-
 # ホテルの座標
 hotel_coords = {
     "ANAインターコンチネンタル": (24.3969, 124.1531),
@@ -71,13 +71,36 @@ guests_data = [
     {"name": "遅め3", "hotel": "グランヴィリオリゾート", "adults": 1, "children": 0, "time_start": "08:05", "time_end": "08:20"},
 ]
 
+# 容量チェック（登録・最適化の前に入力データだけで判定する）
+total_adults = sum(g["adults"] for g in guests_data)
+total_children = sum(g["children"] for g in guests_data)
+capacity_adults = sum(v["capacity_adults"] for v in vehicles_data)
+capacity_children = sum(v["capacity_children"] for v in vehicles_data)
+if total_adults > capacity_adults:
+    print("⚠️ 警告: 大人の総数が車両容量を超えています！")
+    if ABORT_IF_OVER_CAPACITY:
+        print("❌ 容量超過のため登録・最適化を行わずに終了します")
+        sys.exit(1)
+
+print("\n車両を登録中...")
+vehicle_ids = []
+response = session.post(f"{base_url}/vehicles/bulk", json={"items": vehicles_data})
+if response.status_code == 200:
+    for v_data, vehicle in zip(vehicles_data, response.json()):
+        vehicle_ids.append(vehicle["id"])
+        print(f"✅ {v_data['name']}登録成功")
+
 print("\nゲストを登録中...")
 guest_ids = []
-total_adults = 0
-total_children = 0
 
-for g_data in guests_data:
-    coords = hotel_coords[g_data["hotel"]]
+# ゲストごとの座標をホテル座標の配列から一括で引く
+hotels = np.array(list(hotel_coords.values()), dtype=np.float64)
+hotel_idx = {name: i for i, name in enumerate(hotel_coords)}
+idx = np.fromiter((hotel_idx[g["hotel"]] for g in guests_data), dtype=np.int32, count=len(guests_data))
+coords_arr = hotels[idx].tolist()
+
+guest_requests = []
+for g_data, coords in zip(guests_data, coords_arr):
     guest_request = {
         "name": g_data["name"],
         "hotel_name": g_data["hotel"],
@@ -91,24 +114,19 @@ for g_data in guests_data:
     if g_data["time_start"] and g_data["time_end"]:
         guest_request["preferred_pickup_start"] = g_data["time_start"] + ":00"
         guest_request["preferred_pickup_end"] = g_data["time_end"] + ":00"
-    
-    response = requests.post(f"{base_url}/guests/", json=guest_request)
-    if response.status_code == 200:
-        guest = response.json()
+    guest_requests.append(guest_request)
+
+response = session.post(f"{base_url}/guests/bulk", json={"items": guest_requests})
+if response.status_code == 200:
+    for g_data, guest in zip(guests_data, response.json()):
         guest_ids.append(guest["id"])
-        total_adults += g_data["adults"]
-        total_children += g_data["children"]
         print(f"✅ {g_data['name']}登録成功")
 
 print(f"\n登録完了:")
 print(f"- ゲスト数: {len(guest_ids)}名")
 print(f"- 大人: {total_adults}名, 子供: {total_children}名")
 print(f"- 総乗客数: {total_adults + total_children}名")
-print(f"- 車両総容量: {16}名（大人）+ {4}名（子供）")
-
-# 容量チェック
-if total_adults > 16:
-    print("⚠️ 警告: 大人の総数が車両容量を超えています！")
+print(f"- 車両総容量: {capacity_adults}名（大人）+ {capacity_children}名（子供）")
 
 # 最適化を実行
 print(f"\n\n=== 最適化実行 ===")
@@ -132,7 +150,7 @@ optimization_data = {
     "departure_time": "09:00:00"
 }
 
-response = requests.post(f"{base_url}/optimize/route", json=optimization_data)
+response = session.post(f"{base_url}/optimize/route", json=optimization_data)
 if response.status_code == 200:
     job = response.json()
     job_id = job["job_id"]
@@ -140,9 +158,9 @@ if response.status_code == 200:
     
     # 結果を待機
     print("結果を待機中...")
-    time_module.sleep(5)
+    wait_for_job(job_id)
     
-    response = requests.get(f"{base_url}/optimize/result/{job_id}")
+    response = session.get(f"{base_url}/optimize/result/{job_id}")
     if response.status_code == 200:
         result = response.json()
         
@@ -158,22 +176,27 @@ if response.status_code == 200:
         print("\n=== 時間制約の検証 ===")
         all_constraints_met = True
         
+        # ゲストIDごとの時間窓（秒）をループの前に1回だけ解析しておく
+        windows = {
+            guest_id: (g, parse_hms(g['time_start'] + ":00"), parse_hms(g['time_end'] + ":00"))
+            for guest_id, g in zip(guest_ids, guests_data) if g['time_start']
+        }
+        
         for route in result['routes']:
             print(f"\n車両: {route['vehicle_name']}")
             for segment in route['route_segments']:
-                if segment['guest_id']:
-                    # ゲストの時間窓を確認
-                    guest_data = next((g for g in guests_data if guest_ids[guests_data.index(g)] == segment['guest_id']), None)
-                    if guest_data and guest_data['time_start']:
-                        arrival_time = datetime.strptime(segment['arrival_time'], "%H:%M:%S").time()
-                        window_start = datetime.strptime(guest_data['time_start'] + ":00", "%H:%M:%S").time()
-                        window_end = datetime.strptime(guest_data['time_end'] + ":00", "%H:%M:%S").time()
-                        
-                        if arrival_time < window_start or arrival_time > window_end:
-                            print(f"  ❌ {guest_data['name']}: 到着 {arrival_time} (希望 {window_start}-{window_end})")
-                            all_constraints_met = False
-                        else:
-                            print(f"  ✅ {guest_data['name']}: 到着 {arrival_time} (希望 {window_start}-{window_end})")
+                if segment['guest_id'] in windows:
+                    # ゲストの時間窓を確認（時刻は秒で比較）
+                    guest_data, window_start, window_end = windows[segment['guest_id']]
+                    arrival = parse_hms(segment['arrival_time'])
+                    message = (f"{guest_data['name']}: 到着 {segment['arrival_time']} "
+                               f"(希望 {guest_data['time_start']}:00-{guest_data['time_end']}:00)")
+                    
+                    if arrival < window_start or arrival > window_end:
+                        print(f"  ❌ {message}")
+                        all_constraints_met = False
+                    else:
+                        print(f"  ✅ {message}")
         
         if all_constraints_met:
             print("\n✅ すべての時間制約を満たしています！")
@@ -182,8 +205,7 @@ if response.status_code == 200:
         
         # 結果を保存
         filename = "complex_result_time_constraints.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        save_json(filename, result)
         print(f"\n✅ 結果を{filename}に保存しました")
     else:
         print(f"❌ 結果取得失敗: {response.status_code}")
@@ -194,8 +216,9 @@ else:
 
 # クリーンアップ
 print("\n\nクリーンアップ中...")
-for vehicle_id in vehicle_ids:
-    requests.delete(f"{base_url}/vehicles/{vehicle_id}")
-for guest_id in guest_ids:
-    requests.delete(f"{base_url}/guests/{guest_id}")
+asyncio.run(request_all(
+    "DELETE",
+    [f"/vehicles/{vehicle_id}" for vehicle_id in vehicle_ids]
+    + [f"/guests/{guest_id}" for guest_id in guest_ids]
+))
 print("✅ クリーンアップ完了")
\ No newline at end of file
@@ -2,12 +2,10 @@
 最適化結果のDB保存機能をテスト
 """
 
-import requests
-import json
-import time
+import asyncio
 from datetime import datetime
 
-base_url = "http://localhost:8000/api/v1"
+from api_client import base_url, session, wait_for_job, request_all
 
 print("=== 最適化結果DB保存テスト ===\n")
 
@@ -33,10 +31,9 @@ vehicles_data = [
     }
 ]
 
-for v_data in vehicles_data:
-    response = requests.post(f"{base_url}/vehicles/", json=v_data)
-    if response.status_code == 200:
-        vehicle = response.json()
+response = session.post(f"{base_url}/vehicles/bulk", json={"items": vehicles_data})
+if response.status_code == 200:
+    for v_data, vehicle in zip(vehicles_data, response.json()):
         vehicle_ids.append(vehicle["id"])
         print(f"✅ {v_data['name']}登録成功: {vehicle['id']}")
 
@@ -70,10 +67,9 @@ guests_data = [
     }
 ]
 
-for g_data in guests_data:
-    response = requests.post(f"{base_url}/guests/", json=g_data)
-    if response.status_code == 200:
-        guest = response.json()
+response = session.post(f"{base_url}/guests/bulk", json={"items": guests_data})
+if response.status_code == 200:
+    for g_data, guest in zip(guests_data, response.json()):
         guest_ids.append(guest["id"])
         print(f"✅ {g_data['name']}登録成功: {guest['id']}")
 
@@ -90,7 +86,7 @@ tour_data = {
     "vehicle_ids": vehicle_ids
 }
 
-response = requests.post(f"{base_url}/tours/", json=tour_data)
+response = session.post(f"{base_url}/tours/", json=tour_data)
 if response.status_code == 200:
     tour = response.json()
     tour_id = tour["id"]
@@ -102,7 +98,7 @@ else:
 
 # 4. ツアーの最適化を実行
 print(f"\n4. ツアー {tour_id} の最適化を実行中...")
-response = requests.post(f"{base_url}/tours/{tour_id}/optimize")
+response = session.post(f"{base_url}/tours/{tour_id}/optimize")
 if response.status_code == 200:
     result = response.json()
     job_id = result["job_id"]
@@ -110,24 +106,19 @@ if response.status_code == 200:
     
     # 5. 最適化の完了を待つ
     print("\n5. 最適化の完了を待っています...")
-    max_attempts = 10
-    for i in range(max_attempts):
-        time.sleep(2)
-        response = requests.get(f"{base_url}/optimize/status/{job_id}")
-        if response.status_code == 200:
-            status = response.json()
-            print(f"   状態: {status['status']} (進捗: {status['progress_percentage']}%)")
-            
-            if status['status'] == 'completed':
-                print("✅ 最適化完了！")
-                break
-            elif status['status'] == 'failed':
-                print(f"❌ 最適化失敗: {status.get('error_message', 'Unknown error')}")
-                exit(1)
+    status = wait_for_job(job_id)
+    if status:
+        print(f"   状態: {status['status']} (進捗: {status['progress_percentage']}%)")
+        
+        if status['status'] == 'completed':
+            print("✅ 最適化完了！")
+        elif status['status'] == 'failed':
+            print(f"❌ 最適化失敗: {status.get('error_message', 'Unknown error')}")
+            exit(1)
     
     # 6. 最適化結果を取得
     print("\n6. 最適化結果を取得中...")
-    response = requests.get(f"{base_url}/optimize/result/{job_id}")
+    response = session.get(f"{base_url}/optimize/result/{job_id}")
     if response.status_code == 200:
         optimization_result = response.json()
         print("✅ 最適化結果:")
@@ -138,7 +129,7 @@ if response.status_code == 200:
     
     # 7. DBに保存された結果を確認
     print("\n7. DBに保存された最適化結果を確認中...")
-    response = requests.get(f"{base_url}/tours/{tour_id}/optimization-result")
+    response = session.get(f"{base_url}/tours/{tour_id}/optimization-result")
     if response.status_code == 200:
         saved_result = response.json()
         print("✅ DB保存確認:")
@@ -165,19 +156,24 @@ else:
 # 8. クリーンアップ
 print("\n8. クリーンアップ中...")
 # ツアーを削除（関連する最適化結果も削除される）
-response = requests.delete(f"{base_url}/tours/{tour_id}")
+response = session.delete(f"{base_url}/tours/{tour_id}")
 if response.status_code == 200:
     print(f"✅ ツアー {tour_id} を削除しました")
 
+# 車両・ゲストの削除はまとめて並行に送信
+responses = asyncio.run(request_all(
+    "DELETE",
+    [f"/vehicles/{vehicle_id}" for vehicle_id in vehicle_ids]
+    + [f"/guests/{guest_id}" for guest_id in guest_ids]
+))
+
 # 車両を削除
-for vehicle_id in vehicle_ids:
-    response = requests.delete(f"{base_url}/vehicles/{vehicle_id}")
+for vehicle_id, response in zip(vehicle_ids, responses[:len(vehicle_ids)]):
     if response.status_code == 200:
         print(f"✅ 車両 {vehicle_id} を削除しました")
 
 # ゲストを削除
-for guest_id in guest_ids:
-    response = requests.delete(f"{base_url}/guests/{guest_id}")
+for guest_id, response in zip(guest_ids, responses[len(vehicle_ids):]):
     if response.status_code == 200:
         print(f"✅ ゲスト {guest_id} を削除しました")
 
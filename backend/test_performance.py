@@ -2,19 +2,45 @@
 パフォーマンステスト: 処理速度と最適化品質の測定
 """
 
-import requests
+import asyncio
+import httpx
+import io
+import sys
 import time
-import json
-import statistics
-from datetime import datetime
-import random
+import numpy as np
 
-base_url = "http://localhost:8000/api/v1"
+from api_client import JSON_HEADERS, base_url, encode_json, save_json
 
-test_sizes = [5, 10, 20, 30]  # ゲスト数（50は時間がかかりすぎる可能性があるので一旦除外）
-results = []
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # h2が無い環境ではHTTP/1.1のkeep-aliveで接続を使い回す
+    HTTP2_AVAILABLE = False
+
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+NUM_TRIALS = 5  # テストサイズごとの最適化の試行回数
+RANDOM_SEED = 42  # テストデータの乱数シード（実行ごとに同じデータで比較する）
+
+rng = np.random.default_rng(RANDOM_SEED)
+
+
+async def wait_for_job(client, job_id, timeout=60):
+    """ジョブが完了・失敗するまで状態を取得（間隔は0.1秒から最大2秒まで伸ばす）"""
+    delay = 0.1
+    deadline = time.monotonic() + timeout
+    status = None
+    while time.monotonic() < deadline:
+        response = await client.get(f"/optimize/status/{job_id}")
+        if response.status_code == 200:
+            status = response.json()
+            if status['status'] in ('completed', 'failed'):
+                return status
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 2.0)
+    return status
 
-print("=== パフォーマンステスト ===\n")
+
+test_sizes = [5, 10, 20, 30]  # ゲスト数（50は時間がかかりすぎる可能性があるので一旦除外）
 
 # ホテルの座標リスト
 hotel_list = [
@@ -26,114 +52,184 @@ hotel_list = [
     ("川平ベイリゾート", 24.4426, 124.1456)
 ]
 
-for size in test_sizes:
-    print(f"\nテストサイズ: {size}名")
-    
+
+def make_test_data(size):
+    """テストサイズに応じた車両・ゲストの登録データを生成"""
     # 車両を生成（サイズに応じて調整）
     num_vehicles = max(2, (size // 10) + 1)
-    vehicle_ids = []
-    
+    vehicles_data = []
+
     for i in range(num_vehicles):
-        vehicle_data = {
+        vehicles_data.append({
             "name": f"テスト車両{i+1}",
             "capacity_adults": 10,
             "capacity_children": 3,
             "driver_name": f"運転手{i+1}",
             "vehicle_type": "van",
             "status": "available"
-        }
-        response = requests.post(f"{base_url}/vehicles/", json=vehicle_data)
-        if response.status_code == 200:
-            vehicle_ids.append(response.json()["id"])
-    
-    # ゲストを生成
-    guest_ids = []
+        })
+
+    # ゲストを生成（ホテル・人数は全員分をまとめて乱数生成）
+    hotel_idx = rng.integers(0, len(hotel_list), size=size)
+    adults = rng.integers(1, 4, size=size)
+    children = rng.integers(0, 2, size=size)
+    guests_data = []
     for i in range(size):
-        hotel = random.choice(hotel_list)
-        guest_data = {
+        hotel = hotel_list[int(hotel_idx[i])]
+        guests_data.append({
             "name": f"テストゲスト{i+1}",
             "hotel_name": hotel[0],
             "pickup_lat": hotel[1],
             "pickup_lng": hotel[2],
-            "num_adults": random.randint(1, 3),
-            "num_children": random.randint(0, 1),
+            "num_adults": int(adults[i]),
+            "num_children": int(children[i]),
             "special_requirements": []
-        }
-        response = requests.post(f"{base_url}/guests/", json=guest_data)
-        if response.status_code == 200:
-            guest_ids.append(response.json()["id"])
-    
-    # 最適化を5回実行して平均を取る
-    computation_times = []
-    distances = []
-    success_count = 0
-    
-    for i in range(5):
-        start_time = time.time()
-        
-        # 最適化実行
-        optimization_data = {
-            "tour_date": "2024-06-20",
-            "activity_type": "snorkeling",
-            "destination": {
-                "name": "川平湾",
-                "lat": 24.4526,
-                "lng": 124.1456
-            },
-            "participant_ids": guest_ids,
-            "available_vehicle_ids": vehicle_ids,
-            "optimization_strategy": "balanced",
-            "departure_time": "09:00:00"
-        }
-        
-        response = requests.post(f"{base_url}/optimize/route", json=optimization_data)
-        if response.status_code == 200:
-            job_id = response.json()["job_id"]
-            
-            # 結果を待機
-            time.sleep(2)
-            
-            result_response = requests.get(f"{base_url}/optimize/result/{job_id}")
-            if result_response.status_code == 200:
-                result = result_response.json()
-                if result['status'] == 'success':
-                    success_count += 1
-                    distances.append(result['total_distance_km'])
-                    computation_times.append(result['computation_time_seconds'])
-        
-        end_time = time.time()
-        total_time = end_time - start_time
-        print(f"  試行{i+1}: {total_time:.3f}秒")
-    
-    if computation_times:
-        avg_time = statistics.mean(computation_times)
-        std_time = statistics.stdev(computation_times) if len(computation_times) > 1 else 0
-        avg_distance = statistics.mean(distances)
-        
-        print(f"  成功率: {success_count}/5")
-        print(f"  平均計算時間: {avg_time:.3f}秒 (±{std_time:.3f})")
-        print(f"  最大計算時間: {max(computation_times):.3f}秒")
-        print(f"  平均走行距離: {avg_distance:.2f} km")
-        
-        results.append({
+        })
+
+    return vehicles_data, guests_data
+
+
+def make_optimization_body(guest_ids, vehicle_ids):
+    """最適化リクエストの本文（全試行で同じなので1回だけJSONに変換する）"""
+    optimization_data = {
+        "tour_date": "2024-06-20",
+        "activity_type": "snorkeling",
+        "destination": {
+            "name": "川平湾",
+            "lat": 24.4526,
+            "lng": 124.1456
+        },
+        "participant_ids": guest_ids,
+        "available_vehicle_ids": vehicle_ids,
+        "optimization_strategy": "balanced",
+        "departure_time": "09:00:00"
+    }
+    return encode_json(optimization_data)
+
+
+async def run_trial(client, optimization_body):
+    """最適化を1回実行（成功した結果またはNoneと、所要時間を返す）"""
+    start_time = time.perf_counter()
+
+    # 最適化実行
+    result = None
+    response = await client.post("/optimize/route", content=optimization_body, headers=JSON_HEADERS)
+    if response.status_code == 200:
+        job_id = response.json()["job_id"]
+
+        # 結果を待機
+        await wait_for_job(client, job_id)
+
+        result_response = await client.get(f"/optimize/result/{job_id}")
+        if result_response.status_code == 200 and result_response.json()['status'] == 'success':
+            result = result_response.json()
+
+    return result, time.perf_counter() - start_time
+
+
+async def register_size(client, vehicles_data, guests_data):
+    """1つのテストサイズの車両・ゲストを登録（IDは入力順）"""
+    # 車両・ゲストはそれぞれ一括作成エンドポイントで1リクエストで登録
+    vehicle_response, guest_response = await asyncio.gather(
+        client.post("/vehicles/bulk", json={"items": vehicles_data}),
+        client.post("/guests/bulk", json={"items": guests_data})
+    )
+    vehicle_ids = [v["id"] for v in vehicle_response.json()] if vehicle_response.status_code == 200 else []
+    guest_ids = [g["id"] for g in guest_response.json()] if guest_response.status_code == 200 else []
+    return vehicle_ids, guest_ids
+
+
+async def cleanup_size(client, vehicle_ids, guest_ids):
+    """1つのテストサイズで登録した車両・ゲストを削除"""
+    await asyncio.gather(
+        *(client.delete(f"/vehicles/{vehicle_id}") for vehicle_id in vehicle_ids),
+        *(client.delete(f"/guests/{guest_id}") for guest_id in guest_ids)
+    )
+
+
+async def measure_size(client, size, vehicle_ids, guest_ids):
+    """1つのテストサイズを計測（表示する行と集計結果を返す）"""
+    lines = [f"\nテストサイズ: {size}名"]
+
+    # 最適化をNUM_TRIALS回実行して平均を取る
+    # 計算時間を測るため、試行は他の最適化と競合しないよう1回ずつ順に実行する
+    optimization_body = make_optimization_body(guest_ids, vehicle_ids)
+    trials = []
+    for i in range(NUM_TRIALS):
+        result, total_time = await run_trial(client, optimization_body)
+        trials.append((result, total_time))
+        lines.append(f"  試行{i+1}: {total_time:.3f}秒")
+
+    successes = [result for result, _ in trials if result is not None]
+    computation_times = np.asarray(
+        [result['computation_time_seconds'] for result in successes], dtype=np.float64
+    )
+    distances = np.asarray([result['total_distance_km'] for result in successes], dtype=np.float64)
+
+    summary = None
+    if computation_times.size:
+        avg_time = float(computation_times.mean())
+        std_time = float(computation_times.std(ddof=1)) if computation_times.size > 1 else 0.0
+        max_time = float(computation_times.max())
+        avg_distance = float(distances.mean())
+
+        lines.append(f"  成功率: {len(successes)}/{NUM_TRIALS}")
+        lines.append(f"  平均計算時間: {avg_time:.3f}秒 (±{std_time:.3f})")
+        lines.append(f"  最大計算時間: {max_time:.3f}秒")
+        lines.append(f"  平均走行距離: {avg_distance:.2f} km")
+
+        summary = {
             "size": size,
             "avg_time": avg_time,
-            "max_time": max(computation_times),
+            "max_time": max_time,
             "avg_distance": avg_distance,
-            "success_rate": success_count / 5
-        })
-    
-    # クリーンアップ
-    for vehicle_id in vehicle_ids:
-        requests.delete(f"{base_url}/vehicles/{vehicle_id}")
-    for guest_id in guest_ids:
-        requests.delete(f"{base_url}/guests/{guest_id}")
+            "success_rate": len(successes) / NUM_TRIALS
+        }
+
+    return lines, summary
+
+
+async def main():
+    """全テストサイズを計測（登録・削除は並行、最適化の試行は順番に実行）"""
+    test_data = [make_test_data(size) for size in test_sizes]
+    # テスト全体で1つのクライアント（接続プール）を共有する
+    async with httpx.AsyncClient(base_url=base_url, http2=HTTP2_AVAILABLE,
+                                 limits=HTTP_LIMITS, timeout=60) as client:
+        start_time = time.perf_counter()
+        registered = await asyncio.gather(*(
+            register_size(client, vehicles_data, guests_data)
+            for vehicles_data, guests_data in test_data
+        ))
+        outcomes = []
+        for size, (vehicle_ids, guest_ids) in zip(test_sizes, registered):
+            outcomes.append(await measure_size(client, size, vehicle_ids, guest_ids))
+        await asyncio.gather(*(
+            cleanup_size(client, vehicle_ids, guest_ids)
+            for vehicle_ids, guest_ids in registered
+        ))
+        elapsed = time.perf_counter() - start_time
+
+    # 各サイズの表示はバッファにまとめ、標準出力へは1回で書き出す
+    buf = io.StringIO()
+    results = []
+    for lines, summary in outcomes:
+        print("\n".join(lines), file=buf)
+        if summary:
+            results.append(summary)
+    print(f"\n全サイズの所要時間: {elapsed:.3f}秒", file=buf)
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
+    return results
+
+
+print("=== パフォーマンステスト ===\n")
+
+results = asyncio.run(main())
 
 # 結果を保存
-with open("performance_results.json", "w") as f:
-    json.dump(results, f, indent=2)
+save_json("performance_results.json", results)
 
 print("\n=== パフォーマンステスト完了 ===")
 print("\n結果サマリー:")
 for r in results:
-    print(f"- {r['size']}名: 平均{r['avg_time']:.3f}秒, 最大{r['max_time']:.3f}秒")
\ No newline at end of file
+    print(f"- {r['size']}名: 平均{r['avg_time']:.3f}秒, 最大{r['max_time']:.3f}秒")
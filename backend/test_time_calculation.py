@@ -1,10 +1,25 @@
-import requests
-import json
-from datetime import datetime, timedelta
-import time as time_module
+import asyncio
+import re
+import sys
+
+from api_client import TIMEOUT, base_url, session, wait_for_job, request_all, save_json
+
+# 時刻文字列（H:MM[:SS[.ffffff]]）の解析用（小数秒付きでもそのまま扱える）
+_HMS_RE = re.compile(r'(\d{1,2}):(\d{2})(?::\d{2}(?:\.\d+)?)?')
+
+# エンドポイントのURL（呼び出しごとに組み立てない）
+VEHICLES_BULK_URL = f"{base_url}/vehicles/bulk"
+OPTIMIZE_URL = f"{base_url}/optimize/route"
+RESULT_URL_TPL = f"{base_url}/optimize/result/{{}}"
+
+
+def hms_to_minutes(s):
+    """HH:MM:SS を0時からの分数に変換（検証は分単位なので秒は捨てる）"""
+    match = _HMS_RE.match(s)
+    if match is None:
+        raise ValueError(f"Invalid time format: {s}")
+    return int(match[1]) * 60 + int(match[2])
 
-# ベースURL
-base_url = "http://localhost:8000/api/v1"
 
 print("=== 石垣島ツアー最適化 - 時刻計算テスト ===\n")
 
@@ -30,14 +45,14 @@ vehicle_data_list = [
 ]
 
 print("車両を登録中...")
-for vehicle_data in vehicle_data_list:
-    response = requests.post(f"{base_url}/vehicles/", json=vehicle_data)
-    if response.status_code == 200:
-        vehicle = response.json()
+# 一括作成エンドポイントで1リクエストで登録（IDは入力順）
+response = session.post(VEHICLES_BULK_URL, json={"items": vehicle_data_list}, timeout=TIMEOUT)
+if response.status_code == 200:
+    for vehicle_data, vehicle in zip(vehicle_data_list, response.json()):
         vehicles.append(vehicle["id"])
         print(f"✅ {vehicle_data['name']}登録成功: {vehicle['id']}")
-    else:
-        print(f"❌ 車両登録失敗: {response.text}")
+else:
+    print(f"❌ 車両登録失敗: {response.text}")
 
 # 2. 既存のゲストIDを使用（実際のIDに置き換えてください）
 guest_ids = [
@@ -72,7 +87,7 @@ print(f"- ゲスト数: {len(guest_ids)}")
 print(f"- 車両数: {len(vehicles)}")
 print(f"- 出発希望時刻: {optimization_data['departure_time']}")
 
-response = requests.post(f"{base_url}/optimize/route", json=optimization_data)
+response = session.post(OPTIMIZE_URL, json=optimization_data, timeout=TIMEOUT)
 if response.status_code == 200:
     result = response.json()
     job_id = result["job_id"]
@@ -80,9 +95,9 @@ if response.status_code == 200:
     
     # 4. 結果を取得（少し待機）
     print("結果を待機中...")
-    time_module.sleep(3)
+    wait_for_job(job_id)
     
-    response = requests.get(f"{base_url}/optimize/result/{job_id}")
+    response = session.get(RESULT_URL_TPL.format(job_id), timeout=TIMEOUT)
     if response.status_code == 200:
         optimization_result = response.json()
         
@@ -91,14 +106,17 @@ if response.status_code == 200:
         print(f"総所要時間: {optimization_result['total_time_minutes']} 分")
         print(f"使用車両数: {optimization_result['total_vehicles_used']} 台")
         
-        # 各車両のルートを詳細表示
+        # 各車両のルート詳細と時刻計算の検証を1回の走査で作り、まとめて書き出す
+        lines = []
+        check_lines = ["\n=== 時刻計算の検証 ==="]
         for i, route in enumerate(optimization_result['routes']):
-            print(f"\n--- 車両 {i+1}: {route['vehicle_name']} ---")
-            print(f"走行距離: {route['total_distance_km']} km")
-            print(f"所要時間: {route['total_duration_minutes']} 分")
-            print(f"乗車率: {route['vehicle_utilization'] * 100:.1f}%")
+            lines.append(f"\n--- 車両 {i+1}: {route['vehicle_name']} ---")
+            lines.append(f"走行距離: {route['total_distance_km']} km")
+            lines.append(f"所要時間: {route['total_duration_minutes']} 分")
+            lines.append(f"乗車率: {route['vehicle_utilization'] * 100:.1f}%")
             
-            print("\nルート詳細:")
+            lines.append("\nルート詳細:")
+            check_lines.append(f"\n車両: {route['vehicle_name']}")
             for j, segment in enumerate(route['route_segments']):
                 from_loc = segment['from_location']['name']
                 to_loc = segment['to_location']['name']
@@ -107,48 +125,29 @@ if response.status_code == 200:
                 distance = segment['distance_km']
                 duration = segment['duration_minutes']
                 
-                print(f"{j+1}. {from_loc} → {to_loc}")
-                print(f"   到着: {arrival} / 出発: {departure}")
-                print(f"   距離: {distance} km / 時間: {duration} 分")
+                lines.append(f"{j+1}. {from_loc} → {to_loc}")
+                lines.append(f"   到着: {arrival} / 出発: {departure}")
+                lines.append(f"   距離: {distance} km / 時間: {duration} 分")
                 
                 if segment['guest_id']:
-                    print(f"   ピックアップゲスト: ID {segment['guest_id']}")
-        
-        # === 時刻計算の検証 ===
-        print("\n=== 時刻計算の検証 ===")
-        for route in optimization_result['routes']:
-            print(f"\n車両: {route['vehicle_name']}")
-            
-            # 最初のセグメントの出発時刻から累積時間を計算
-            if route['route_segments']:
-                first_departure = datetime.strptime(route['route_segments'][0]['departure_time'], "%H:%M:%S")
-                base_minutes = first_departure.hour * 60 + first_departure.minute
-                
-                cumulative_minutes = base_minutes
+                    lines.append(f"   ピックアップゲスト: ID {segment['guest_id']}")
                 
-                for i, segment in enumerate(route['route_segments']):
-                    arrival_time = datetime.strptime(segment['arrival_time'], "%H:%M:%S")
-                    expected_minutes = cumulative_minutes + segment['duration_minutes']
-                    expected_arrival = datetime(2000, 1, 1, expected_minutes // 60, expected_minutes % 60)
-                    
-                    actual_minutes = arrival_time.hour * 60 + arrival_time.minute
-                    
-                    if abs(actual_minutes - expected_minutes) > 1:  # 1分の誤差を許容
-                        print(f"⚠️ 時刻のずれ検出:")
-                        print(f"   場所: {segment['to_location']['name']}")
-                        print(f"   実際の到着時刻: {segment['arrival_time']}")
-                        print(f"   期待される到着時刻: {expected_arrival.strftime('%H:%M:%S')}")
-                    else:
-                        print(f"✅ {segment['to_location']['name']}: 時刻計算正確")
-                    
-                    # 次のセグメントのために累積時間を更新
-                    if i < len(route['route_segments']) - 1:
-                        next_departure = datetime.strptime(route['route_segments'][i+1]['departure_time'], "%H:%M:%S")
-                        cumulative_minutes = next_departure.hour * 60 + next_departure.minute
+                # 区間の出発時刻＋所要時間が到着時刻と一致するか（1分の誤差を許容）
+                expected_minutes = hms_to_minutes(departure) + duration
+                actual_minutes = hms_to_minutes(arrival)
+                if abs(actual_minutes - expected_minutes) > 1:
+                    check_lines.append(f"⚠️ 時刻のずれ検出:")
+                    check_lines.append(f"   場所: {to_loc}")
+                    check_lines.append(f"   実際の到着時刻: {arrival}")
+                    check_lines.append(f"   期待される到着時刻: {expected_minutes // 60:02d}:{expected_minutes % 60:02d}:00")
+                else:
+                    check_lines.append(f"✅ {to_loc}: 時刻計算正確")
+        
+        lines.extend(check_lines)
+        sys.stdout.write("\n".join(lines) + "\n")
         
         # JSON形式で保存
-        with open('optimization_result.json', 'w', encoding='utf-8') as f:
-            json.dump(optimization_result, f, ensure_ascii=False, indent=2)
+        save_json('optimization_result.json', optimization_result)
         print("\n✅ 結果をoptimization_result.jsonに保存しました")
         
     else:
@@ -158,7 +157,8 @@ else:
 
 # 5. クリーンアップ（登録した車両を削除）
 print("\nクリーンアップ中...")
-for vehicle_id in vehicles:
-    response = requests.delete(f"{base_url}/vehicles/{vehicle_id}")
+responses = asyncio.run(request_all("DELETE", [f"/vehicles/{vehicle_id}" for vehicle_id in vehicles]))
+for vehicle_id, response in zip(vehicles, responses):
     if response.status_code == 200:
-        print(f"✅ 車両 {vehicle_id} を削除しました")
\ No newline at end of file
+        print(f"✅ 車両 {vehicle_id} を削除しました")
+session.close()
@@ -8,7 +8,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from datetime import date, time
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
 
 from app.models.database import SessionLocal, engine
 from app.models.tour import Tour, ActivityType, TourStatus
@@ -16,24 +17,35 @@ from app.models.tour_participant import TourParticipant
 from app.crud.tour import tour as crud_tour
 from app.schemas.tour import TourCreate
 
+# テストで使う既存ゲストのID（インポート時に1回だけUUIDに変換）
+PARTICIPANT_UUIDS = (
+    UUID("4e70ad1f-39c7-4962-806d-aaacb7227935"),
+    UUID("1a80cd57-9f26-45af-82bb-2bf324650c61"),
+    UUID("8d5f6a7b-48b9-41e7-9974-5f70e4c85722"),
+    UUID("4aa1a21a-ce53-4487-9c94-33b247949576"),
+)
 
-def test_direct_creation():
+# 直接作成テストのツアーで毎回変わらない項目
+BASE_TOUR = dict(
+    destination_name="川平湾",
+    destination_lat=24.4526,
+    destination_lng=124.1456,
+    status=TourStatus.planning
+)
+
+
+def run_direct_creation(db: Session):
     """データベースに直接ツアーを作成してテスト"""
-    db = SessionLocal()
-    
     try:
         # テスト用のツアーデータ
         print("=== Direct Database Creation Test ===")
         
         # ツアーを直接作成
         new_tour = Tour(
+            **BASE_TOUR,
             tour_date=date(2024, 6, 20),
             activity_type=ActivityType.snorkeling,
-            destination_name="川平湾",
-            destination_lat=24.4526,
-            destination_lng=124.1456,
             departure_time=time(9, 0),
-            status=TourStatus.planning,
             optimization_strategy="balanced"
         )
         
@@ -41,26 +53,23 @@ def test_direct_creation():
         db.flush()
         print(f"✅ Tour created with ID: {new_tour.id}")
         
-        # 参加者を追加
-        participant_ids = [
-            "4e70ad1f-39c7-4962-806d-aaacb7227935",
-            "1a80cd57-9f26-45af-82bb-2bf324650c61"
+        # 参加者はORMのオブジェクトを作らず、1回のINSERT（executemany）でまとめて追加
+        participant_rows = [
+            {"tour_id": new_tour.id, "guest_id": guest_id, "pickup_order": idx + 1}
+            for idx, guest_id in enumerate(PARTICIPANT_UUIDS[:2])
         ]
-        
-        for idx, guest_id in enumerate(participant_ids):
-            participant = TourParticipant(
-                tour_id=new_tour.id,
-                guest_id=UUID(guest_id),
-                pickup_order=idx + 1
-            )
-            db.add(participant)
-            print(f"✅ Added participant: {guest_id}")
+        db.execute(insert(TourParticipant), participant_rows)
+        for row in participant_rows:
+            print(f"✅ Added participant: {row['guest_id']}")
         
         db.commit()
         print("✅ Successfully created tour with participants")
         
         # 作成したツアーを確認
-        created_tour = db.query(Tour).filter(Tour.id == new_tour.id).first()
+        # 参加者も同じクエリで取得（len(participants)で遅延ロードを発生させない）
+        created_tour = db.query(Tour).options(
+            joinedload(Tour.participants)
+        ).filter(Tour.id == new_tour.id).first()
         print(f"\nCreated tour:")
         print(f"  ID: {created_tour.id}")
         print(f"  Date: {created_tour.tour_date}")
@@ -72,14 +81,10 @@ def test_direct_creation():
         import traceback
         traceback.print_exc()
         db.rollback()
-    finally:
-        db.close()
 
 
-def test_crud_creation():
+def run_crud_creation(db: Session):
     """CRUDを使用したツアー作成テスト"""
-    db = SessionLocal()
-    
     try:
         print("\n=== CRUD Creation Test ===")
         
@@ -93,10 +98,7 @@ def test_crud_creation():
             departure_time=time(8, 0),
             status=TourStatus.planning,
             optimization_strategy="safety",
-            participant_ids=[
-                UUID("4e70ad1f-39c7-4962-806d-aaacb7227935"),
-                UUID("8d5f6a7b-48b9-41e7-9974-5f70e4c85722")
-            ]
+            participant_ids=[PARTICIPANT_UUIDS[0], PARTICIPANT_UUIDS[2]]
         )
         
         # CRUDで作成
@@ -115,30 +117,34 @@ def test_crud_creation():
         print(f"Error type: {type(e).__name__}")
         import traceback
         traceback.print_exc()
-    finally:
-        db.close()
+        db.rollback()
 
 
-def check_database_tables():
+def check_database_tables(db: Session):
     """データベーステーブルの存在確認"""
     print("\n=== Database Tables Check ===")
     
-    from sqlalchemy import inspect
-    inspector = inspect(engine)
+    from sqlalchemy import MetaData, inspect
+    connection = db.connection()
+    inspector = inspect(connection)
     
     tables = inspector.get_table_names()
     print(f"Existing tables: {tables}")
     
-    # 各テーブルのカラムを確認
-    for table in ['tours', 'tour_participants', 'guests']:
-        if table in tables:
-            columns = inspector.get_columns(table)
-            print(f"\n{table} columns:")
-            for col in columns:
-                print(f"  - {col['name']}: {col['type']}")
+    # 各テーブルのカラムを確認（存在するテーブルをまとめて1回でリフレクション）
+    targets = [table for table in ['tours', 'tour_participants', 'guests'] if table in tables]
+    metadata = MetaData()
+    metadata.reflect(bind=connection, only=targets)
+    for table in targets:
+        print(f"\n{table} columns:")
+        for col in metadata.tables[table].columns:
+            print(f"  - {col.name}: {col.type}")
 
 
 if __name__ == "__main__":
-    check_database_tables()
-    test_direct_creation()
-    test_crud_creation()
\ No newline at end of file
+    # 全テストで1つの接続・セッションを使い回す（接続プールからの取得は1回だけ）
+    with engine.connect() as connection, SessionLocal(bind=connection) as db:
+        check_database_tables(db)
+        db.rollback()  # テーブル確認の読み取りトランザクションを閉じる
+        run_direct_creation(db)
+        run_crud_creation(db)
\ No newline at end of file